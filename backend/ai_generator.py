@@ -1,6 +1,45 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator
 from typing import Any
 
 import anthropic
+import httpx
+
+# Marks the end of a prompt prefix that Anthropic should cache server-side
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Let Claude return several tool_use blocks in one response
+TOOL_CHOICE = {"type": "auto", "disable_parallel_tool_use": False}
+
+# Connection pool limits for the shared HTTP client, sized for bursty traffic
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+
+# One client per API key so every generator reuses the same keep-alive pool
+_clients: dict[str, anthropic.AsyncAnthropic] = {}
+
+# Default cap on in-flight Anthropic requests per generator, to protect the rate limit
+MAX_CONCURRENT_REQUESTS = 5
+
+# Tool outputs that carry no information worth another round-trip to summarize.
+# Failures are left out: their text holds internal error details that must not
+# be shown to the user verbatim, so Claude still writes the reply for them.
+EMPTY_RESULT_PREFIXES = (
+    "No relevant content found",
+    "No course found matching",
+)
+
+
+def get_client(api_key: str) -> anthropic.AsyncAnthropic:
+    """Return the shared async Anthropic client for an API key, creating it lazily"""
+    client = _clients.get(api_key)
+    if client is None:
+        client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            http_client=anthropic.DefaultAsyncHttpxClient(limits=HTTP_LIMITS),
+        )
+        _clients[api_key] = client
+    return client
 
 
 class AIGenerator:
@@ -20,36 +59,53 @@ Tool Usage Guidelines:
 - **Course outline questions**: Use get_course_outline tool for questions about course structure, lesson lists, course organization, or "what lessons are in X course"
 - **Course content questions**: Use search_course_content tool for detailed content within courses
 - **Multi-step queries**: Use Round 1 to gather context, Round 2 to refine search
+- **Parallel calls**: For maximum efficiency, whenever you need to perform multiple independent operations, invoke all relevant tools simultaneously in a single response rather than sequentially
 - Synthesize tool results into accurate, fact-based responses
 - If tools yield no results, state this clearly without offering alternatives
 
 Response Protocol:
-- **General knowledge questions**: Answer using existing knowledge without tools
-- **Course outline questions**: Use get_course_outline tool first, then present the complete course structure including course title, course link, and all lesson details
-- **Course content questions**: Use search_course_content tool first, then answer
-- **No meta-commentary**:
- - Provide direct answers only — no reasoning process, search explanations, or question-type analysis
- - Do not mention "based on the search results" or "using the outline tool"
-
-All responses must be:
-1. **Brief, Concise and focused** - Get to the point quickly
-2. **Educational** - Maintain instructional value
-3. **Clear** - Use accessible language
-4. **Example-supported** - Include relevant examples when they aid understanding
+- **General knowledge questions**: Answer from existing knowledge without tools
+- **Course outline questions**: Present the course title, course link, and every lesson number and title
+- **No meta-commentary**: Give direct answers only — never describe your reasoning, searches, or tools
+
+Responses must be brief, educational, clear, and include examples when they aid understanding.
+"""
+
+    # Minimal prompt for queries answered without tools or course context
+    GENERAL_PROMPT = """You are a helpful assistant on a course materials platform.
+Answer general questions directly and concisely from your own knowledge.
 Provide only the direct answer to what was asked.
 """
 
-    def __init__(self, api_key: str, model: str):
-        self.client = anthropic.Anthropic(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        router_model: str | None = None,
+        max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS,
+    ):
+        self.client = get_client(api_key)
         self.model = model
+        # Cheaper model for tool-free wrap-up summaries of gathered results
+        self.router_model = router_model or model
+
+        # Semaphores are bound to one event loop, so it is created lazily per loop
+        self.max_concurrent_requests = max_concurrent_requests
+        self._semaphore: asyncio.Semaphore | None = None
+        self._semaphore_loop: asyncio.AbstractEventLoop | None = None
 
         # Pre-build base API parameters
         self.base_params = {"model": self.model, "temperature": 0, "max_tokens": 800}
 
-    def generate_response(
+        # Static system block with a cache breakpoint so the prompt prefix is reused
+        self.system_blocks = [
+            {"type": "text", "text": self.SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}
+        ]
+
+    async def generate_response(
         self,
         query: str,
-        conversation_history: str | None = None,
+        conversation_history: list[dict] | None = None,
         tools: list | None = None,
         tool_manager=None,
     ):
@@ -58,7 +114,7 @@ Provide only the direct answer to what was asked.
 
         Args:
             query: The user's question or request
-            conversation_history: Previous messages for context
+            conversation_history: Previous user/assistant messages for context
             tools: Available tools the AI can use
             tool_manager: Manager to execute tools
 
@@ -66,81 +122,304 @@ Provide only the direct answer to what was asked.
             Tuple of (response_text, sources) if tools available, otherwise just response_text
         """
 
-        # Build system content efficiently - avoid string ops when possible
-        system_content = (
-            f"{self.SYSTEM_PROMPT}\n\nPrevious conversation:\n{conversation_history}"
-            if conversation_history
-            else self.SYSTEM_PROMPT
-        )
-
-        # Prepare API call parameters efficiently
-        api_params = {
-            **self.base_params,
-            "messages": [{"role": "user", "content": query}],
-            "system": system_content,
-        }
+        api_params = self._build_params(query, conversation_history, tools)
 
         # Add tools if available
         if tools:
-            api_params["tools"] = tools
-            api_params["tool_choice"] = {"type": "auto"}
-
             # Use multi-round conversation for tool-enabled queries
-            response_text, sources = self._execute_multi_round_conversation(
+            response_text, sources = await self._execute_multi_round_conversation(
                 api_params, tool_manager
             )
             return response_text, sources
 
         # Simple response for non-tool queries
-        response = self.client.messages.create(**api_params)
+        response = await self._create_message(api_params)
         return response.content[0].text
 
-    def _execute_tools_for_round(self, response, tool_manager):
+    async def stream_response(
+        self,
+        query: str,
+        conversation_history: list[dict] | None = None,
+        tools: list | None = None,
+        tool_manager=None,
+        max_rounds: int = 2,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Stream AI response text as it is generated, running tool rounds as needed.
+
+        Rounds without tools are streamed so the first tokens reach the caller
+        as soon as Claude produces them. Rounds that may call tools are buffered
+        until their stop reason is known, so text Claude writes before a tool_use
+        block is never shown; only the round that ends the turn is emitted.
+
+        Args:
+            query: The user's question or request
+            conversation_history: Previous user/assistant messages for context
+            tools: Available tools the AI can use
+            tool_manager: Manager to execute tools
+            max_rounds: Maximum number of tool calling rounds
+
+        Yields:
+            {"type": "text", "text": ...} events for each text delta, followed by
+            a single {"type": "sources", "sources": [...]} event
+        """
+        api_params = self._build_params(query, conversation_history, tools)
+        messages = api_params["messages"].copy()
+        all_sources = []
+        tool_memo = {}
+
+        for round_num in range(1, max_rounds + 2):
+            if round_num > max_rounds:
+                # Max rounds reached, final call without tools
+                params = self._make_wrap_up_params(messages, api_params["system"])
+            else:
+                params = self._make_params(
+                    self._mark_last_message(messages) if round_num > 1 else messages,
+                    api_params["system"],
+                    api_params.get("tools"),
+                )
+
+            can_use_tools = "tools" in params
+            buffered = []
+            async with self._request_semaphore():
+                async with self.client.messages.stream(**params) as stream:
+                    async for text in stream.text_stream:
+                        if can_use_tools:
+                            buffered.append(text)
+                        else:
+                            yield {"type": "text", "text": text}
+                    response = await stream.get_final_message()
+
+            if response.stop_reason != "tool_use" or round_num > max_rounds:
+                if buffered:
+                    yield {"type": "text", "text": "".join(buffered)}
+                break
+
+            # Execute tools and feed results into the next round
+            messages.append({"role": "assistant", "content": response.content})
+            tool_results, round_sources = await self._execute_tools_for_round(
+                response, tool_manager, tool_memo
+            )
+            messages.append({"role": "user", "content": tool_results})
+            all_sources.extend(round_sources)
+
+            # Skip further calls when there is nothing to summarize
+            if self._all_results_empty(tool_results):
+                yield {"type": "text", "text": self._join_results(tool_results)}
+                break
+
+        yield {"type": "sources", "sources": all_sources}
+
+    async def generate_batch(
+        self, queries: list[str], poll_interval: float = 10.0
+    ) -> list[str]:
+        """
+        Answer many independent queries through the Message Batches API.
+
+        Batches are billed at half the per-token price but complete
+        asynchronously, so this is only meant for offline work such as
+        evaluation runs. Tools are not offered since they need interactive rounds.
+
+        Args:
+            queries: Questions to answer, each as a single-shot request
+            poll_interval: Seconds to wait between batch status checks
+
+        Returns:
+            Response texts in the same order as queries
+        """
+        batch = await self.client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": f"q-{index}",
+                    "params": self._make_params(
+                        [{"role": "user", "content": query}], self.GENERAL_PROMPT
+                    ),
+                }
+                for index, query in enumerate(queries)
+            ]
+        )
+
+        # Wait for every request in the batch to finish processing
+        while batch.processing_status != "ended":
+            await asyncio.sleep(poll_interval)
+            batch = await self.client.messages.batches.retrieve(batch.id)
+
+        responses = [""] * len(queries)
+        async for entry in await self.client.messages.batches.results(batch.id):
+            index = int(entry.custom_id.removeprefix("q-"))
+            if entry.result.type == "succeeded":
+                responses[index] = entry.result.message.content[0].text
+            else:
+                responses[index] = f"Error: Batch request {entry.result.type}"
+
+        return responses
+
+    def _build_params(
+        self,
+        query: str,
+        conversation_history: list[dict] | None,
+        tools: list | None,
+    ) -> dict[str, Any]:
+        """Build the Messages API parameters for the first round of a query"""
+        # Prior turns are prepended as messages so the system block stays byte-stable
+        messages = [{"role": "user", "content": query}]
+        if conversation_history:
+            messages = [
+                *self._mark_last_message(conversation_history),
+                *messages,
+            ]
+
+        # The long tool-oriented prompt is only worth sending when tools are offered
+        if not tools:
+            return self._make_params(messages, self.GENERAL_PROMPT)
+
+        return self._make_params(
+            messages, self.system_blocks, self._with_cache_control(tools)
+        )
+
+    def _make_params(
+        self, messages: list, system, tools: list | None = None
+    ) -> dict[str, Any]:
+        """Build the parameters for a single Messages API request in one dict"""
+        params = {**self.base_params, "messages": messages, "system": system}
+        if tools:
+            params["tools"] = tools
+            params["tool_choice"] = TOOL_CHOICE
+        return params
+
+    def _make_wrap_up_params(self, messages: list, system) -> dict[str, Any]:
+        """Build a tool-free summary request that runs on the router model"""
+        return {**self._make_params(messages, system), "model": self.router_model}
+
+    def _request_semaphore(self) -> asyncio.Semaphore:
+        """Return the concurrency limit semaphore for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _create_message(self, params: dict[str, Any]):
+        """Send a Messages API request, bounded by the concurrency limit"""
+        async with self._request_semaphore():
+            return await self.client.messages.create(**params)
+
+    @staticmethod
+    def _with_cache_control(tools: list) -> list:
+        """Return tools with a cache breakpoint on the last definition"""
+        # ToolManager already pins the breakpoint - reuse its list as-is
+        if "cache_control" in tools[-1]:
+            return tools
+        return [*tools[:-1], {**tools[-1], "cache_control": CACHE_CONTROL}]
+
+    @staticmethod
+    def _mark_last_message(messages: list[dict]) -> list[dict]:
+        """Return a copy of messages with a cache breakpoint on the last message"""
+        last = messages[-1]
+        content = last["content"]
+        if isinstance(content, str):
+            blocks = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+        elif content and isinstance(content[-1], dict):
+            blocks = [*content[:-1], {**content[-1], "cache_control": CACHE_CONTROL}]
+        else:
+            return messages
+        return [*messages[:-1], {**last, "content": blocks}]
+
+    @staticmethod
+    def _run_tool(content_block, tool_manager):
+        """
+        Execute a single tool_use block and collect the sources it produced.
+
+        Sources are returned by the call itself rather than read back from the
+        tools, so concurrent executions in one round never see each other's.
+
+        Returns:
+            Tuple of (tool_result_content, sources)
+        """
+        try:
+            return tool_manager.execute_tool_with_sources(
+                content_block.name, **content_block.input
+            )
+        except Exception as e:
+            return f"Tool execution failed: {str(e)}", []
+
+    @staticmethod
+    def _tool_call_key(content_block) -> tuple[str, str]:
+        """Identify a tool call by its name and canonicalized input"""
+        return content_block.name, json.dumps(
+            content_block.input, sort_keys=True, default=str
+        )
+
+    async def _execute_tools_for_round(
+        self, response, tool_manager, memo: dict | None = None
+    ):
         """
         Execute tools for a round and return results + sources.
 
+        Independent tool_use blocks are executed concurrently on worker threads;
+        results keep the order in which Claude requested them. Identical calls,
+        within this round or recorded in memo from earlier rounds, run only once.
+
         Args:
             response: The response containing tool use requests
             tool_manager: Manager to execute tools
+            memo: Per-conversation cache of (content, sources) by tool call key
 
         Returns:
             Tuple of (tool_results, round_sources)
         """
+        if memo is None:
+            memo = {}
+
+        tool_uses = [block for block in response.content if block.type == "tool_use"]
+        keys = [self._tool_call_key(block) for block in tool_uses]
+
+        # Only execute distinct calls that haven't already run in this conversation
+        pending = {}
+        for block, key in zip(tool_uses, keys, strict=True):
+            if key not in memo:
+                pending.setdefault(key, block)
+
+        # Tools are synchronous, so run each off the event loop
+        outcomes = await asyncio.gather(
+            *(
+                asyncio.to_thread(self._run_tool, block, tool_manager)
+                for block in pending.values()
+            )
+        )
+        memo.update(zip(pending, outcomes, strict=True))
+
+        # Anthropic requires one tool_result per tool_use_id, repeats included
         tool_results = []
         round_sources = []
-
-        for content_block in response.content:
-            if content_block.type == "tool_use":
-                try:
-                    tool_result = tool_manager.execute_tool(
-                        content_block.name, **content_block.input
-                    )
-
-                    tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": content_block.id,
-                            "content": tool_result,
-                        }
-                    )
-
-                    # Collect sources from this tool execution
-                    sources = tool_manager.get_last_sources()
-                    round_sources.extend(sources)
-                    tool_manager.reset_sources()
-
-                except Exception as e:
-                    tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": content_block.id,
-                            "content": f"Tool execution failed: {str(e)}",
-                        }
-                    )
+        for block, key in zip(tool_uses, keys, strict=True):
+            content, sources = memo[key]
+            tool_results.append(
+                {
+                    "type": "tool_result",
+                    "tool_use_id": block.id,
+                    "content": content,
+                }
+            )
+            round_sources.extend(sources)
 
         return tool_results, round_sources
 
-    def _execute_multi_round_conversation(
+    @staticmethod
+    def _all_results_empty(tool_results: list[dict]) -> bool:
+        """Check whether every tool in a round found nothing"""
+        return bool(tool_results) and all(
+            isinstance(result["content"], str)
+            and result["content"].startswith(EMPTY_RESULT_PREFIXES)
+            for result in tool_results
+        )
+
+    @staticmethod
+    def _join_results(tool_results: list[dict]) -> str:
+        """Combine tool result messages into a single response"""
+        return "\n".join(result["content"] for result in tool_results)
+
+    async def _execute_multi_round_conversation(
         self, api_params: dict[str, Any], tool_manager, max_rounds: int = 2
     ):
         """
@@ -156,11 +435,17 @@ Provide only the direct answer to what was asked.
         """
         messages = api_params["messages"].copy()
         all_sources = []
+        tool_memo = {}
 
         for round_num in range(1, max_rounds + 1):
-            # Make API call with current messages
-            current_params = {**api_params, "messages": messages}
-            response = self.client.messages.create(**current_params)
+            # Make API call with current messages, moving the cache breakpoint to
+            # the latest tool results so later rounds reuse the earlier prefix
+            current_params = self._make_params(
+                self._mark_last_message(messages) if round_num > 1 else messages,
+                api_params["system"],
+                api_params.get("tools"),
+            )
+            response = await self._create_message(current_params)
 
             # Add assistant response to conversation
             messages.append({"role": "assistant", "content": response.content})
@@ -168,24 +453,24 @@ Provide only the direct answer to what was asked.
             # Check if tools are requested
             if response.stop_reason == "tool_use":
                 # Execute tools and collect results + sources
-                tool_results, round_sources = self._execute_tools_for_round(
-                    response, tool_manager
+                tool_results, round_sources = await self._execute_tools_for_round(
+                    response, tool_manager, tool_memo
                 )
                 messages.append({"role": "user", "content": tool_results})
                 all_sources.extend(round_sources)
 
+                # Nothing useful came back - report it instead of paying for a summary
+                if self._all_results_empty(tool_results):
+                    return self._join_results(tool_results), all_sources
+
                 # Continue to next round if not at max
                 if round_num < max_rounds:
                     continue
-                else:
-                    # Max rounds reached, make final call without tools
-                    final_params = {
-                        **self.base_params,
-                        "messages": messages,
-                        "system": api_params["system"],
-                    }
-                    final_response = self.client.messages.create(**final_params)
-                    return final_response.content[0].text, all_sources
+
+                # Max rounds reached, make final call without tools
+                final_params = self._make_wrap_up_params(messages, api_params["system"])
+                final_response = await self._create_message(final_params)
+                return final_response.content[0].text, all_sources
             else:
                 # No more tools requested - return final response
                 return response.content[0].text, all_sources
@@ -193,7 +478,7 @@ Provide only the direct answer to what was asked.
         # Fallback (shouldn't reach here)
         return "Unable to complete request within maximum rounds", all_sources
 
-    def _handle_tool_execution(
+    async def _handle_tool_execution(
         self, initial_response, base_params: dict[str, Any], tool_manager
     ):
         """
@@ -234,12 +519,8 @@ Provide only the direct answer to what was asked.
             messages.append({"role": "user", "content": tool_results})
 
         # Prepare final API call without tools
-        final_params = {
-            **self.base_params,
-            "messages": messages,
-            "system": base_params["system"],
-        }
+        final_params = self._make_wrap_up_params(messages, base_params["system"])
 
         # Get final response
-        final_response = self.client.messages.create(**final_params)
+        final_response = await self._create_message(final_params)
         return final_response.content[0].text
@@ -14,6 +14,8 @@ class Config:
     # Anthropic API settings
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")
     ANTHROPIC_MODEL: str = "claude-sonnet-4-20250514"
+    ROUTER_MODEL: str = "claude-haiku-4-5-20251001"  # Wrap-up summaries after tools
+    MAX_CONCURRENT_REQUESTS: int = 5  # In-flight Anthropic requests per generator
 
     # Embedding model settings
     EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
@@ -24,8 +26,14 @@ class Config:
     MAX_RESULTS: int = 5  # Maximum search results to return
     MAX_HISTORY: int = 2  # Number of conversation messages to remember
 
+    # Semantic response cache settings
+    RESPONSE_CACHE_THRESHOLD: float = 0.92  # Minimum cosine similarity for a hit
+    RESPONSE_CACHE_TTL: int = 3600  # Seconds before a cached answer expires
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000  # LRU capacity
+
     # Database paths
     CHROMA_PATH: str = "./chroma_db"  # ChromaDB storage location
+    CHROMA_IN_MEMORY: bool = False  # Keep ChromaDB in memory, ignoring CHROMA_PATH
 
 
 config = Config()
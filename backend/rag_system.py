@@ -1,12 +1,48 @@
+import asyncio
 import os
+import re
+from collections.abc import AsyncIterator
+from typing import Any
 
 from ai_generator import AIGenerator
 from document_processor import DocumentProcessor
 from models import Course
+from response_cache import SemanticResponseCache
 from search_tools import CourseOutlineTool, CourseSearchTool, ToolManager
 from session_manager import SessionManager
 from vector_store import VectorStore
 
+# Queries that clearly need no course context: greetings, thanks and bare arithmetic
+GENERAL_QUERY_PATTERN = re.compile(
+    r"^\s*(?:(?:hi|hello|hey|thanks|thank you|good (?:morning|afternoon|evening))"
+    r"\b[\s!.,]*"
+    r"|(?:what is |what's |calculate |compute )?[\d\s+\-*/().^%=]+\??)\s*$",
+    re.IGNORECASE,
+)
+
+# Numbers and capitalized words after the first, such as lesson numbers and course
+# names; embeddings barely separate queries that differ only in these
+QUERY_TERM_PATTERN = re.compile(r"\d+|(?<=\s)[A-Z][\w-]*")
+
+# Prepended to course questions before they are sent to the model with tools
+COURSE_QUERY_PREFIX = "Answer this question about course materials: "
+
+# User-facing messages for known API failures, checked in order against str(error)
+ERROR_MESSAGES = (
+    (
+        re.compile(r"authentication_error|invalid x-api-key"),
+        "Error: Invalid Anthropic API key. Please check your ANTHROPIC_API_KEY in the .env file.",
+    ),
+    (
+        re.compile(r"rate_limit"),
+        "Error: API rate limit exceeded. Please try again later.",
+    ),
+    (
+        re.compile(r"network|connection"),
+        "Error: Network connection issue. Please check your internet connection.",
+    ),
+)
+
 
 class RAGSystem:
     """Main orchestrator for the Retrieval-Augmented Generation system"""
@@ -19,12 +55,23 @@ class RAGSystem:
             config.CHUNK_SIZE, config.CHUNK_OVERLAP
         )
         self.vector_store = VectorStore(
-            config.CHROMA_PATH, config.EMBEDDING_MODEL, config.MAX_RESULTS
+            config.CHROMA_PATH,
+            config.EMBEDDING_MODEL,
+            config.MAX_RESULTS,
+            in_memory=config.CHROMA_IN_MEMORY,
         )
         self.ai_generator = AIGenerator(
-            config.ANTHROPIC_API_KEY, config.ANTHROPIC_MODEL
+            config.ANTHROPIC_API_KEY,
+            config.ANTHROPIC_MODEL,
+            config.ROUTER_MODEL,
+            config.MAX_CONCURRENT_REQUESTS,
         )
         self.session_manager = SessionManager(config.MAX_HISTORY)
+        self.response_cache = SemanticResponseCache(
+            config.RESPONSE_CACHE_THRESHOLD,
+            config.RESPONSE_CACHE_TTL,
+            config.RESPONSE_CACHE_MAX_ENTRIES,
+        )
 
         # Initialize search tools
         self.tool_manager = ToolManager()
@@ -55,13 +102,19 @@ class RAGSystem:
             # Add course content chunks to vector store
             self.vector_store.add_course_content(course_chunks)
 
+            # Cached answers may predate the new content
+            self.response_cache.clear()
+
             return course, len(course_chunks)
         except Exception as e:
             print(f"Error processing course document {file_path}: {e}")
             return None, 0
 
     def add_course_folder(
-        self, folder_path: str, clear_existing: bool = False
+        self,
+        folder_path: str,
+        clear_existing: bool = False,
+        max_files: int | None = None,
     ) -> tuple[int, int]:
         """
         Add all course documents from a folder.
@@ -69,6 +122,7 @@ class RAGSystem:
         Args:
             folder_path: Path to folder containing course documents
             clear_existing: Whether to clear existing data first
+            max_files: Only process this many documents, in name order
 
         Returns:
             Tuple of (total courses added, total chunks created)
@@ -80,6 +134,7 @@ class RAGSystem:
         if clear_existing:
             print("Clearing existing data for fresh rebuild...")
             self.vector_store.clear_all_data()
+            self.response_cache.clear()
 
         if not os.path.exists(folder_path):
             print(f"Folder {folder_path} does not exist")
@@ -88,37 +143,50 @@ class RAGSystem:
         # Get existing course titles to avoid re-processing
         existing_course_titles = set(self.vector_store.get_existing_course_titles())
 
+        # Collect supported documents in a stable order so max_files is repeatable
+        file_names = sorted(
+            file_name
+            for file_name in os.listdir(folder_path)
+            if file_name.lower().endswith((".pdf", ".docx", ".txt"))
+            and os.path.isfile(os.path.join(folder_path, file_name))
+        )
+        if max_files is not None:
+            file_names = file_names[:max_files]
+
         # Process each file in the folder
-        for file_name in os.listdir(folder_path):
+        for file_name in file_names:
             file_path = os.path.join(folder_path, file_name)
-            if os.path.isfile(file_path) and file_name.lower().endswith(
-                (".pdf", ".docx", ".txt")
-            ):
-                try:
-                    # Check if this course might already exist
-                    # We'll process the document to get the course ID, but only add if new
-                    course, course_chunks = (
-                        self.document_processor.process_course_document(file_path)
+            try:
+                # Check if this course might already exist
+                # We'll process the document to get the course ID, but only add if new
+                course, course_chunks = self.document_processor.process_course_document(
+                    file_path
+                )
+
+                if course and course.title not in existing_course_titles:
+                    # This is a new course - add it to the vector store
+                    self.vector_store.add_course_metadata(course)
+                    self.vector_store.add_course_content(course_chunks)
+                    total_courses += 1
+                    total_chunks += len(course_chunks)
+                    print(
+                        f"Added new course: {course.title} ({len(course_chunks)} chunks)"
                     )
+                    existing_course_titles.add(course.title)
+                elif course:
+                    print(f"Course already exists: {course.title} - skipping")
+            except Exception as e:
+                print(f"Error processing {file_name}: {e}")
 
-                    if course and course.title not in existing_course_titles:
-                        # This is a new course - add it to the vector store
-                        self.vector_store.add_course_metadata(course)
-                        self.vector_store.add_course_content(course_chunks)
-                        total_courses += 1
-                        total_chunks += len(course_chunks)
-                        print(
-                            f"Added new course: {course.title} ({len(course_chunks)} chunks)"
-                        )
-                        existing_course_titles.add(course.title)
-                    elif course:
-                        print(f"Course already exists: {course.title} - skipping")
-                except Exception as e:
-                    print(f"Error processing {file_name}: {e}")
+        # Cached answers may predate the new content
+        if total_courses:
+            self.response_cache.clear()
 
         return total_courses, total_chunks
 
-    def query(self, query: str, session_id: str | None = None) -> tuple[str, list[str]]:
+    async def query(
+        self, query: str, session_id: str | None = None
+    ) -> tuple[str, list[str]]:
         """
         Process a user query using the RAG system with tool-based search.
 
@@ -137,19 +205,27 @@ class RAGSystem:
                     [],
                 )
 
-            # Create prompt for the AI with clear instructions
-            prompt = f"""Answer this question about course materials: {query}"""
+            prompt, tools = self._prepare_request(query)
 
             # Get conversation history if session exists
             history = None
             if session_id:
                 history = self.session_manager.get_conversation_history(session_id)
 
+            # Serve semantically repeated questions without calling the LLM
+            cache_key = await self._cache_key(query, history)
+            cached = self._get_cached_response(cache_key)
+            if cached:
+                response, sources = cached
+                if session_id:
+                    self.session_manager.add_exchange(session_id, query, response)
+                return response, sources
+
             # Generate response using AI with tools
-            result = self.ai_generator.generate_response(
+            result = await self.ai_generator.generate_response(
                 query=prompt,
                 conversation_history=history,
-                tools=self.tool_manager.get_tool_definitions(),
+                tools=tools,
                 tool_manager=self.tool_manager,
             )
 
@@ -164,32 +240,145 @@ class RAGSystem:
             if session_id:
                 self.session_manager.add_exchange(session_id, query, response)
 
+            self._put_cached_response(cache_key, response, sources)
+
             # Return response with sources from tool searches
             return response, sources
 
         except Exception as e:
-            # Handle different types of errors with helpful messages
-            error_message = str(e)
+            return self._error_message(e), []
+
+    async def query_stream(
+        self, query: str, session_id: str | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Process a user query and stream the response as it is generated.
+
+        Args:
+            query: User's question
+            session_id: Optional session ID for conversation context
 
-            if (
-                "authentication_error" in error_message
-                or "invalid x-api-key" in error_message
+        Yields:
+            {"type": "text"} delta events and a terminal {"type": "sources"} event,
+            or a single {"type": "error"} event if the query fails
+        """
+        try:
+            # Validate API key is configured
+            if not self.config.ANTHROPIC_API_KEY:
+                yield {
+                    "type": "error",
+                    "message": "Error: Anthropic API key not configured. Please set ANTHROPIC_API_KEY in your .env file.",
+                }
+                return
+
+            prompt, tools = self._prepare_request(query)
+
+            history = None
+            if session_id:
+                history = self.session_manager.get_conversation_history(session_id)
+
+            cache_key = await self._cache_key(query, history)
+            cached = self._get_cached_response(cache_key)
+            if cached:
+                response, sources = cached
+                yield {"type": "text", "text": response}
+                yield {"type": "sources", "sources": sources}
+                if session_id:
+                    self.session_manager.add_exchange(session_id, query, response)
+                return
+
+            response_parts = []
+            sources = []
+            async for event in self.ai_generator.stream_response(
+                query=prompt,
+                conversation_history=history,
+                tools=tools,
+                tool_manager=self.tool_manager,
             ):
-                return (
-                    "Error: Invalid Anthropic API key. Please check your ANTHROPIC_API_KEY in the .env file.",
-                    [],
-                )
-            elif "rate_limit" in error_message:
-                return "Error: API rate limit exceeded. Please try again later.", []
-            elif "network" in error_message or "connection" in error_message:
-                return (
-                    "Error: Network connection issue. Please check your internet connection.",
-                    [],
-                )
-            else:
-                # Log the full error for debugging but return a user-friendly message
-                print(f"RAG System Error: {error_message}")
-                return f"Error: Query processing failed. {error_message}", []
+                if event["type"] == "text":
+                    response_parts.append(event["text"])
+                elif event["type"] == "sources":
+                    sources = event["sources"]
+                yield event
+
+            # Update conversation history once the full response is known
+            response = "".join(response_parts)
+            if session_id:
+                self.session_manager.add_exchange(session_id, query, response)
+
+            self._put_cached_response(cache_key, response, sources)
+
+        except Exception as e:
+            yield {"type": "error", "message": self._error_message(e)}
+
+    def _prepare_request(self, query: str) -> tuple[str, list | None]:
+        """
+        Build the prompt and tool list for a query.
+
+        General-knowledge queries are sent as-is without tools so that the
+        course-oriented system prompt and tool definitions are not billed.
+        """
+        if GENERAL_QUERY_PATTERN.match(query):
+            return query, None
+
+        prompt = COURSE_QUERY_PREFIX + query
+        return prompt, self.tool_manager.get_tool_definitions()
+
+    async def _cache_key(self, query: str, history: list[dict] | None):
+        """
+        Build the response-cache key for a query.
+
+        Returns:
+            Tuple of (query embedding, exact-match context) or None if embedding
+            failed. The context pairs the last user turn with the query's numbers
+            and capitalized terms, so "lesson 1" and "lesson 2" never share answers.
+        """
+        # The previous user turn scopes follow-up questions to their conversation
+        last_user_turn = None
+        if history:
+            user_turns = [m["content"] for m in history if m["role"] == "user"]
+            last_user_turn = user_turns[-1] if user_turns else None
+        terms = tuple(sorted(set(QUERY_TERM_PATTERN.findall(query))))
+
+        try:
+            embedding = await asyncio.to_thread(self.vector_store.embed_query, query)
+            return embedding, (last_user_turn, terms)
+        except Exception as e:
+            print(f"Error embedding query for response cache: {e}")
+            return None
+
+    def _get_cached_response(self, cache_key) -> tuple[str, list] | None:
+        """Look up a cached answer, treating cache failures as misses"""
+        if cache_key is None:
+            return None
+        try:
+            return self.response_cache.get(*cache_key)
+        except Exception as e:
+            print(f"Error reading response cache: {e}")
+            return None
+
+    def _put_cached_response(self, cache_key, response: str, sources: list):
+        """Store an answer in the response cache on a best-effort basis"""
+        if cache_key is None:
+            return
+        embedding, context = cache_key
+        try:
+            self.response_cache.put(embedding, response, sources, context)
+        except Exception as e:
+            print(f"Error writing response cache: {e}")
+
+    @staticmethod
+    def _error_message(error: Exception) -> str:
+        """Translate an exception into a user-friendly error message"""
+        error_message = str(error)
+
+        for pattern, message in ERROR_MESSAGES:
+            if pattern.search(error_message):
+                return message
+
+        # Log the full error for debugging but return a user-friendly message
+        print(f"RAG System Error: {error_message}")
+        return f"Error: Query processing failed. {error_message}"
 
     def get_course_analytics(self) -> dict:
         """Get analytics about the course catalog"""
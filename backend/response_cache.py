@@ -0,0 +1,121 @@
+import time
+from collections.abc import Hashable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+
+@dataclass
+class CachedResponse:
+    """A previously generated answer together with its sources"""
+
+    answer: str
+    sources: list[dict[str, Any]]
+    context: Hashable | None  # Must match exactly, e.g. the session's last user turn
+    created_at: float
+    last_used: float
+
+
+class SemanticResponseCache:
+    """In-memory cache of answers keyed by query embedding similarity"""
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        ttl_seconds: float = 3600,
+        max_entries: int = 10000,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        # Row i of the matrix is the L2-normalized embedding for entries[i]. It is
+        # allocated at full capacity on the first put, once the dimension is known,
+        # and rows past len(entries) are unused
+        self.embeddings: np.ndarray | None = None
+        self.entries: list[CachedResponse] = []
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """Convert an embedding to a unit-length float32 vector"""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(
+        self, embedding, context: Hashable | None = None
+    ) -> tuple[str, list[dict[str, Any]]] | None:
+        """
+        Look up a cached answer for a semantically similar query.
+
+        Args:
+            embedding: Embedding of the incoming query
+            context: Exact-match scope, such as the session's last user turn
+
+        Returns:
+            Tuple of (answer, sources) on a hit, otherwise None
+        """
+        if not self.entries:
+            return None
+
+        # Cosine similarity against every cached query in a single BLAS call
+        similarities = self.embeddings[: len(self.entries)] @ self._normalize(embedding)
+
+        now = time.monotonic()
+        for index in np.argsort(similarities)[::-1]:
+            if similarities[index] < self.threshold:
+                break
+            entry = self.entries[index]
+            if entry.context != context or now - entry.created_at > self.ttl_seconds:
+                continue
+            entry.last_used = now
+            return entry.answer, entry.sources
+
+        return None
+
+    def put(
+        self,
+        embedding,
+        answer: str,
+        sources: list[dict[str, Any]],
+        context: Hashable | None = None,
+    ):
+        """Store an answer, evicting expired and least recently used entries"""
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        if len(self.entries) >= self.max_entries:
+            self._remove(
+                min(range(len(self.entries)), key=lambda i: self.entries[i].last_used)
+            )
+
+        vector = self._normalize(embedding)
+        if self.embeddings is None:
+            self.embeddings = np.zeros(
+                (self.max_entries, vector.shape[0]), dtype=np.float32
+            )
+        self.embeddings[len(self.entries)] = vector
+        self.entries.append(CachedResponse(answer, sources, context, now, now))
+
+    def clear(self):
+        """Remove all cached answers, keeping the allocated matrix for reuse"""
+        self.entries = []
+
+    def _evict_expired(self, now: float):
+        """Drop entries older than the configured TTL"""
+        # Walk backwards so moving the last row into a freed slot is safe
+        for index in range(len(self.entries) - 1, -1, -1):
+            if now - self.entries[index].created_at > self.ttl_seconds:
+                self._remove(index)
+
+    def _remove(self, index: int):
+        """Remove a single entry by moving the last row into its slot"""
+        last = len(self.entries) - 1
+        if index != last:
+            self.embeddings[index] = self.embeddings[last]
+            self.entries[index] = self.entries[last]
+        self.entries.pop()
+
+    def __len__(self) -> int:
+        return len(self.entries)
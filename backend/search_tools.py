@@ -17,6 +17,10 @@ class Tool(ABC):
         """Execute the tool with given parameters"""
         pass
 
+    def execute_with_sources(self, **kwargs) -> tuple[str, list]:
+        """Execute the tool and return its result with the sources it produced"""
+        return self.execute(**kwargs), []
+
 
 class CourseSearchTool(Tool):
     """Tool for searching course content with semantic course name matching"""
@@ -67,6 +71,23 @@ class CourseSearchTool(Tool):
         Returns:
             Formatted search results or error message
         """
+        result, self.last_sources = self.execute_with_sources(
+            query, course_name, lesson_number
+        )
+        return result
+
+    def execute_with_sources(
+        self,
+        query: str,
+        course_name: str | None = None,
+        lesson_number: int | None = None,
+    ) -> tuple[str, list]:
+        """
+        Execute the search without touching shared state, so parallel calls are safe.
+
+        Returns:
+            Tuple of (formatted search results or error message, sources)
+        """
 
         # Use the vector store's unified search interface
         results = self.store.search(
@@ -75,7 +96,7 @@ class CourseSearchTool(Tool):
 
         # Handle errors
         if results.error:
-            return results.error
+            return results.error, []
 
         # Handle empty results
         if results.is_empty():
@@ -84,46 +105,43 @@ class CourseSearchTool(Tool):
                 filter_info += f" in course '{course_name}'"
             if lesson_number:
                 filter_info += f" in lesson {lesson_number}"
-            return f"No relevant content found{filter_info}."
+            return f"No relevant content found{filter_info}.", []
 
         # Format and return results
         return self._format_results(results)
 
-    def _format_results(self, results: SearchResults) -> str:
+    def _format_results(self, results: SearchResults) -> tuple[str, list]:
         """Format search results with course and lesson context"""
         formatted = []
         sources = []  # Track sources for the UI (now with links)
 
+        # Fetch links for every lesson-specific result in a single store lookup
+        lesson_links = self.store.get_lesson_links(
+            [
+                (meta.get("course_title", "unknown"), meta["lesson_number"])
+                for meta in results.metadata
+                if meta.get("lesson_number") is not None
+            ]
+        )
+
         for doc, meta in zip(results.documents, results.metadata, strict=False):
             course_title = meta.get("course_title", "unknown")
             lesson_num = meta.get("lesson_number")
 
-            # Build context header
-            header = f"[{course_title}"
-            if lesson_num is not None:
-                header += f" - Lesson {lesson_num}"
-            header += "]"
+            # One label serves as both the context header and the UI source text
+            if lesson_num is None:
+                source_text = course_title
+                lesson_link = None
+            else:
+                source_text = f"{course_title} - Lesson {lesson_num}"
+                lesson_link = lesson_links.get((course_title, lesson_num))
 
             # Track source for the UI with lesson link if available
-            source_text = course_title
-            if lesson_num is not None:
-                source_text += f" - Lesson {lesson_num}"
-
-            # Get lesson link if this is a lesson-specific result
-            lesson_link = None
-            if lesson_num is not None:
-                lesson_link = self.store.get_lesson_link(course_title, lesson_num)
+            sources.append({"text": source_text, "link": lesson_link})
 
-            # Create source object with text and optional link
-            source_obj = {"text": source_text, "link": lesson_link}
-            sources.append(source_obj)
+            formatted.append(f"[{source_text}]\n{doc}")
 
-            formatted.append(f"{header}\n{doc}")
-
-        # Store sources for retrieval
-        self.last_sources = sources
-
-        return "\n\n".join(formatted)
+        return "\n\n".join(formatted), sources
 
 
 class CourseOutlineTool(Tool):
@@ -214,6 +232,7 @@ class ToolManager:
 
     def __init__(self):
         self.tools = {}
+        self._definitions: list | None = None
 
     def register_tool(self, tool: Tool):
         """Register any tool that implements the Tool interface"""
@@ -222,10 +241,24 @@ class ToolManager:
         if not tool_name:
             raise ValueError("Tool must have a 'name' in its definition")
         self.tools[tool_name] = tool
+        self._definitions = None
 
     def get_tool_definitions(self) -> list:
-        """Get all tool definitions for Anthropic tool calling"""
-        return [tool.get_tool_definition() for tool in self.tools.values()]
+        """
+        Get all tool definitions for Anthropic tool calling.
+
+        The list is built once per set of registered tools and the same object
+        is returned on every call. The last definition carries a cache
+        breakpoint so the tools join the cached prompt prefix.
+        """
+        if self._definitions is None:
+            definitions = [
+                dict(tool.get_tool_definition()) for tool in self.tools.values()
+            ]
+            if definitions:
+                definitions[-1]["cache_control"] = {"type": "ephemeral"}
+            self._definitions = definitions
+        return self._definitions
 
     def execute_tool(self, tool_name: str, **kwargs) -> str:
         """Execute a tool by name with given parameters"""
@@ -234,6 +267,13 @@ class ToolManager:
 
         return self.tools[tool_name].execute(**kwargs)
 
+    def execute_tool_with_sources(self, tool_name: str, **kwargs) -> tuple[str, list]:
+        """Execute a tool by name and return its result with the sources it produced"""
+        if tool_name not in self.tools:
+            return f"Tool '{tool_name}' not found", []
+
+        return self.tools[tool_name].execute_with_sources(**kwargs)
+
     def get_last_sources(self) -> list:
         """Get sources from the last search operation"""
         # Check all tools for last_sources attribute
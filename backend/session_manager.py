@@ -43,8 +43,8 @@ class SessionManager:
         self.add_message(session_id, "user", user_message)
         self.add_message(session_id, "assistant", assistant_message)
 
-    def get_conversation_history(self, session_id: str | None) -> str | None:
-        """Get formatted conversation history for a session"""
+    def get_conversation_history(self, session_id: str | None) -> list[dict] | None:
+        """Get conversation history for a session as Anthropic-style messages"""
         if not session_id or session_id not in self.sessions:
             return None
 
@@ -52,12 +52,8 @@ class SessionManager:
         if not messages:
             return None
 
-        # Format messages for context
-        formatted_messages = []
-        for msg in messages:
-            formatted_messages.append(f"{msg.role.title()}: {msg.content}")
-
-        return "\n".join(formatted_messages)
+        # Keep history as a stable message list so it can be cached as a prefix
+        return [{"role": msg.role, "content": msg.content} for msg in messages]
 
     def clear_session(self, session_id: str):
         """Clear all messages from a session"""
@@ -0,0 +1,655 @@
+import os
+from collections import namedtuple
+from types import MappingProxyType, SimpleNamespace
+from unittest.mock import AsyncMock, Mock, create_autospec
+
+import pytest
+from config import Config
+from models import Course, CourseChunk, Lesson
+from search_tools import CourseSearchTool
+from vector_store import SearchResults
+
+# Canned search results shared by every vector store fixture
+_SAMPLE_RESULTS = SearchResults(
+    documents=["Sample course content about Python programming"],
+    metadata=[{"course_title": "Python Basics", "lesson_number": 1}],
+    distances=[0.1],
+    error=None,
+)
+_EMPTY_RESULTS = SearchResults(documents=[], metadata=[], distances=[], error=None)
+_ERROR_RESULTS = SearchResults(
+    documents=[], metadata=[], distances=[], error="ChromaDB connection failed"
+)
+
+
+# Minimal stand-ins for Anthropic Message and content block objects
+_Response = namedtuple("_Response", "content stop_reason")
+_Block = namedtuple("_Block", "type text name id input", defaults=(None,) * 4)
+
+
+def _text_response(text, stop_reason="end_turn"):
+    """Build a Messages API response that ends the turn with text"""
+    return _Response([_Block("text", text)], stop_reason)
+
+
+def _tool_use_response(*tool_uses):
+    """Build a Messages API response requesting the given (name, id, input) tools"""
+    return _Response(
+        [
+            _Block("tool_use", name=name, id=tool_id, input=tool_input)
+            for name, tool_id, tool_input in tool_uses
+        ],
+        "tool_use",
+    )
+
+
+class _FakeMessageStream:
+    """Minimal stand-in for the SDK's async message stream context manager"""
+
+    def __init__(self, chunks, final_message):
+        self.chunks = chunks
+        self.final_message = final_message
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    @property
+    async def text_stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def get_final_message(self):
+        return self.final_message
+
+
+# Canned Anthropic responses, built once and shared by the client fixtures
+_TEST_RESPONSE = _text_response("This is a test response")
+
+# Response sequences, replayed per test through _replay
+_TOOL_USE_SEQ = (
+    _tool_use_response(("search_course_content", "tool_123", {"query": "test query"})),
+    _text_response("Response after tool use"),
+)
+_PARALLEL_TOOL_USE_SEQ = (
+    _tool_use_response(
+        ("search_course_content", "tool_1", {"query": "MCP", "lesson_number": 1}),
+        ("get_course_outline", "tool_2", {"course_title": "Python Basics"}),
+    ),
+    _text_response("Response after parallel tool use"),
+)
+
+
+# Events yielded by mock_rag_system.query_stream
+_STREAM_EVENTS = (
+    {"type": "text", "text": "Python is "},
+    {"type": "text", "text": "a programming language"},
+    {
+        "type": "sources",
+        "sources": [
+            {"text": "Python Basics - Lesson 1", "link": "https://example.com/lesson/1"}
+        ],
+    },
+)
+
+
+# Read-only so a test mutating shared tool definitions fails loudly
+_TOOL_DEFS = (
+    MappingProxyType(
+        {"name": "search_course_content", "description": "Search course content"}
+    ),
+    MappingProxyType(
+        {"name": "get_course_outline", "description": "Get course outline"}
+    ),
+)
+
+_TOOL_RESULTS = {
+    "get_course_outline": "Course: Python Basics\nLessons: 1. Introduction, 2. Variables",
+    "search_course_content": "Found content about Python variables and data types",
+}
+
+# Sources reported after each tool executes
+_TOOL_SOURCES = {
+    "get_course_outline": [
+        {"text": "Python Basics Course", "link": "https://example.com/course"}
+    ],
+    "search_course_content": [
+        {"text": "Python Basics - Lesson 2", "link": "https://example.com/lesson/2"}
+    ],
+}
+
+
+class _StubToolManager:
+    """Tool manager stand-in that returns each tool's result with its sources"""
+
+    def __init__(self):
+        # Kept as a Mock so tests can assert on calls and override side_effect
+        self.execute_tool_with_sources = Mock(side_effect=self._execute_tool)
+
+    @staticmethod
+    def _execute_tool(tool_name, **kwargs):
+        return (
+            _TOOL_RESULTS.get(tool_name, "Mock tool result"),
+            _TOOL_SOURCES.get(tool_name, []),
+        )
+
+    def get_tool_definitions(self):
+        return _TOOL_DEFS
+
+
+def _replay(responses):
+    """Side effect returning each response in turn via a plain next() call"""
+    remaining = iter(responses)
+    return lambda **kwargs: next(remaining)
+
+
+# Successful search results and lesson links for mock_vector_store
+_VECTOR_STORE_DEFAULTS = {
+    "search.return_value": _SAMPLE_RESULTS,
+    "get_lesson_links.return_value": {
+        ("Python Basics", 1): "https://example.com/lesson/1"
+    },
+}
+
+
+def _reset_mock(mock):
+    """Clear calls, return values and side effects left by a previous test"""
+    mock.reset_mock(return_value=True, side_effect=True)
+    return mock
+
+
+class _StubVectorStore:
+    """Plain stand-in for VectorStore when no test inspects the calls made to it"""
+
+    def __init__(self, result):
+        self._result = result
+
+    def search(self, *args, **kwargs):
+        return self._result
+
+    def get_lesson_links(self, lessons):
+        return dict.fromkeys(lessons, "https://example.com/lesson/1")
+
+
+class _LazyPath(os.PathLike):
+    """Directory path that is only created the first time it is resolved"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._path = None
+
+    def __fspath__(self):
+        if self._path is None:
+            self._path = str(self._factory())
+        return self._path
+
+    __str__ = __fspath__
+
+
+@pytest.fixture(scope="session")
+def temp_chroma_path(tmp_path_factory):
+    """Temporary ChromaDB directory, created only if a real VectorStore opens it"""
+    return _LazyPath(lambda: tmp_path_factory.mktemp("chroma", numbered=False))
+
+
+@pytest.fixture(scope="session")
+def test_config(temp_chroma_path):
+    """Create test configuration"""
+    config = Config()
+    config.CHROMA_PATH = temp_chroma_path
+    config.ANTHROPIC_API_KEY = "test-key"
+    config.MAX_RESULTS = 3
+    return config
+
+
+@pytest.fixture(scope="session")
+def _shared_vector_store():
+    """VectorStore mock built once and reset before each test"""
+    # No spec: tests never rely on it and it makes every attribute access slower
+    return Mock()
+
+
+@pytest.fixture
+def mock_vector_store(_shared_vector_store):
+    """Create a mock VectorStore for testing"""
+    mock_store = _reset_mock(_shared_vector_store)
+    mock_store.configure_mock(**_VECTOR_STORE_DEFAULTS)
+    return mock_store
+
+
+@pytest.fixture(scope="session")
+def vector_store_factory():
+    """Return a builder for stub VectorStores in "ok", "empty" or "error" mode"""
+    results = {"ok": _SAMPLE_RESULTS, "empty": _EMPTY_RESULTS, "error": _ERROR_RESULTS}
+
+    def make(mode="ok"):
+        return _StubVectorStore(results[mode])
+
+    return make
+
+
+@pytest.fixture(params=["ok", "empty", "error"])
+def any_vector_store(request, vector_store_factory):
+    """Stub VectorStore parametrized over every result mode"""
+    return vector_store_factory(request.param)
+
+
+@pytest.fixture(scope="session")
+def sample_course():
+    """Create a sample course for testing"""
+    # Known-valid literals, so skip pydantic validation
+    return Course.model_construct(
+        title="Python Basics",
+        instructor="John Doe",
+        course_link="https://example.com/python-basics",
+        lessons=[
+            Lesson.model_construct(
+                lesson_number=1,
+                title="Introduction to Python",
+                lesson_link="https://example.com/lesson/1",
+            ),
+            Lesson.model_construct(
+                lesson_number=2,
+                title="Variables and Data Types",
+                lesson_link="https://example.com/lesson/2",
+            ),
+        ],
+    )
+
+
+@pytest.fixture(scope="session")
+def sample_course_chunks():
+    """Create sample course chunks for testing"""
+    return [
+        CourseChunk.model_construct(
+            content="Python is a high-level programming language",
+            course_title="Python Basics",
+            lesson_number=1,
+            chunk_index=0,
+        ),
+        CourseChunk.model_construct(
+            content="Variables in Python can store different types of data",
+            course_title="Python Basics",
+            lesson_number=2,
+            chunk_index=1,
+        ),
+    ]
+
+
+@pytest.fixture(scope="session")
+def sample_folder_courses():
+    """Processed (course, chunks) pairs for a folder of three documents"""
+    # Only titles and chunk counts are read, so plain namespaces stand in
+    return tuple(
+        (
+            SimpleNamespace(title=f"Course {number}"),
+            tuple(SimpleNamespace(content=f"Chunk {i}") for i in range(chunk_count)),
+        )
+        for number, chunk_count in ((1, 2), (2, 1), (3, 3))
+    )
+
+
+@pytest.fixture(scope="session")
+def ai_gen():
+    """AIGenerator shared by the whole session; tests swap its client per test"""
+    from ai_generator import AIGenerator
+
+    return AIGenerator("test-key", "claude-sonnet-4-20250514")
+
+
+@pytest.fixture
+def use_client(ai_gen, monkeypatch):
+    """Swap the mock Anthropic client into ai_gen for the rest of the test"""
+
+    def _use(client):
+        monkeypatch.setattr(ai_gen, "client", client)
+
+    return _use
+
+
+@pytest.fixture
+def mock_anthropic_client():
+    """Create a mock Anthropic client for testing"""
+    mock_client = Mock()
+    mock_client.messages.create = AsyncMock()
+
+    # Mock successful response without tool use
+    mock_client.messages.create.return_value = _TEST_RESPONSE
+
+    return mock_client
+
+
+@pytest.fixture
+def scripted_anthropic_client(request):
+    """Create a mock Anthropic client replaying the responses passed as an indirect param"""
+    mock_client = Mock()
+    mock_client.messages.create = AsyncMock(side_effect=_replay(request.param))
+
+    return mock_client
+
+
+@pytest.fixture
+def mock_anthropic_client_batch():
+    """Create a mock Anthropic client that processes a message batch"""
+    mock_client = Mock()
+
+    # Batch is still processing when submitted and has ended on the first poll
+    pending_batch = SimpleNamespace(id="batch_123", processing_status="in_progress")
+    ended_batch = SimpleNamespace(id="batch_123", processing_status="ended")
+    mock_client.messages.batches.create = AsyncMock(return_value=pending_batch)
+    mock_client.messages.batches.retrieve = AsyncMock(return_value=ended_batch)
+
+    def make_entry(custom_id, text=None):
+        if text is None:
+            result = SimpleNamespace(type="errored")
+        else:
+            message = SimpleNamespace(content=[_Block("text", text)])
+            result = SimpleNamespace(type="succeeded", message=message)
+        return SimpleNamespace(custom_id=custom_id, result=result)
+
+    # Results stream back in completion order, not submission order
+    async def results():
+        for entry in [
+            make_entry("q-2", "Answer to third"),
+            make_entry("q-0", "Answer to first"),
+            make_entry("q-1"),
+        ]:
+            yield entry
+
+    mock_client.messages.batches.results = AsyncMock(
+        side_effect=lambda batch_id: results()
+    )
+
+    return mock_client
+
+
+@pytest.fixture
+def mock_anthropic_client_with_tool_use():
+    """Create a mock Anthropic client that triggers tool use"""
+    mock_client = Mock()
+    mock_client.messages.create = AsyncMock()
+
+    # Tool use first, then the final answer
+    mock_client.messages.create.side_effect = _replay(_TOOL_USE_SEQ)
+
+    return mock_client
+
+
+@pytest.fixture
+def mock_anthropic_client_with_parallel_tool_use():
+    """Create a mock Anthropic client that requests two tools in one response"""
+    mock_client = Mock()
+    mock_client.messages.create = AsyncMock()
+
+    # Two independent tool uses in one response, then the final answer
+    mock_client.messages.create.side_effect = _replay(_PARALLEL_TOOL_USE_SEQ)
+
+    return mock_client
+
+
+@pytest.fixture(scope="session")
+def _shared_search_tool(_shared_vector_store):
+    """CourseSearchTool over the shared mock store, built once per session"""
+    return CourseSearchTool(_shared_vector_store)
+
+
+@pytest.fixture
+def course_search_tool(_shared_search_tool, mock_vector_store):
+    """Create CourseSearchTool with mock vector store"""
+    # mock_vector_store resets the store; sources are the only tool state
+    _shared_search_tool.last_sources = []
+    return _shared_search_tool
+
+
+@pytest.fixture(scope="session")
+def course_search_tool_empty(vector_store_factory):
+    """Create CourseSearchTool with mock vector store that returns empty results"""
+    return CourseSearchTool(vector_store_factory("empty"))
+
+
+@pytest.fixture(scope="session")
+def course_search_tool_error(vector_store_factory):
+    """Create CourseSearchTool with mock vector store that returns errors"""
+    return CourseSearchTool(vector_store_factory("error"))
+
+
+@pytest.fixture
+def mock_tool_manager_with_sources():
+    """Create a mock tool manager that tracks sources across rounds"""
+    return _StubToolManager()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _prime_shared_fixtures(request):
+    """Build the shared stubs at session start so the first test's timing is honest"""
+    for name in (
+        "ai_gen",
+        "test_config",
+        "sample_course",
+        "sample_course_chunks",
+        "_shared_search_tool",
+        "course_search_tool_empty",
+        "course_search_tool_error",
+    ):
+        request.getfixturevalue(name)
+
+
+# API Testing Fixtures
+
+
+@pytest.fixture(scope="session")
+def test_frontend_dir(tmp_path_factory):
+    """Create a temporary frontend directory with test files"""
+    temp_dir = str(tmp_path_factory.mktemp("frontend"))
+
+    # Create test HTML file
+    html_content = """<!DOCTYPE html>
+<html>
+<head><title>Test App</title></head>
+<body><h1>Test RAG System</h1></body>
+</html>"""
+
+    with open(os.path.join(temp_dir, "index.html"), "w") as f:
+        f.write(html_content)
+
+    # Create test CSS file
+    css_content = "body { font-family: Arial, sans-serif; }"
+    with open(os.path.join(temp_dir, "styles.css"), "w") as f:
+        f.write(css_content)
+
+    return temp_dir
+
+
+@pytest.fixture
+def patched_rag(monkeypatch):
+    """Replace RAGSystem's components with mocks; build() creates a system using them"""
+    # Imported lazily so collecting non-RAG tests skips the RAGSystem import graph
+    from ai_generator import AIGenerator
+    from rag_system import RAGSystem
+
+    mocks = SimpleNamespace(
+        dp=Mock(),
+        vs=Mock(),
+        ai=create_autospec(AIGenerator),  # Keeps generate_response awaitable
+        sm=Mock(),
+    )
+    monkeypatch.setattr("rag_system.DocumentProcessor", mocks.dp)
+    monkeypatch.setattr("rag_system.VectorStore", mocks.vs)
+    monkeypatch.setattr("rag_system.AIGenerator", mocks.ai)
+    monkeypatch.setattr("rag_system.SessionManager", mocks.sm)
+
+    def build(api_key="valid-key"):
+        config = Config()
+        config.ANTHROPIC_API_KEY = api_key
+        return RAGSystem(config)
+
+    mocks.build = build
+    return mocks
+
+
+@pytest.fixture(scope="session")
+def _shared_rag_system():
+    """Mock RAG system shared by the session-scoped test app"""
+    # Imported lazily so collecting non-API tests skips the RAGSystem import graph
+    from rag_system import RAGSystem
+
+    mock_system = Mock(spec=RAGSystem)
+    mock_system.session_manager = Mock()
+    return mock_system
+
+
+@pytest.fixture
+def mock_rag_system(_shared_rag_system):
+    """Create a mock RAG system for API testing"""
+    mock_system = _reset_mock(_shared_rag_system)
+
+    # Mock successful query response
+    mock_system.query.return_value = (
+        "This is a test response about Python programming",
+        [{"text": "Python Basics - Lesson 1", "link": "https://example.com/lesson/1"}],
+    )
+
+    # Mock streamed response: two text deltas, then the sources
+    async def query_stream(query, session_id=None):
+        for event in _STREAM_EVENTS:
+            yield event
+
+    mock_system.query_stream.side_effect = query_stream
+
+    # Mock course analytics
+    mock_system.get_course_analytics.return_value = {
+        "total_courses": 2,
+        "course_titles": ["Python Basics", "JavaScript Fundamentals"],
+    }
+
+    # Mock session manager
+    mock_system.session_manager.create_session.return_value = "test-session-123"
+    mock_system.session_manager.clear_session.return_value = None
+
+    return mock_system
+
+
+@pytest.fixture(scope="session")
+def test_app(_shared_rag_system, test_frontend_dir):
+    """Create a test FastAPI app with mocked dependencies"""
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.middleware.trustedhost import TrustedHostMiddleware
+    from fastapi.staticfiles import StaticFiles
+    from pydantic import BaseModel
+
+    mock_rag_system = _shared_rag_system
+
+    # Create test app
+    app = FastAPI(title="Test RAG System")
+
+    # Add middleware
+    app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Define models inline to avoid import issues
+    class QueryRequest(BaseModel):
+        query: str
+        session_id: str | None = None
+
+    class SourceItem(BaseModel):
+        text: str
+        link: str | None = None
+
+    class QueryResponse(BaseModel):
+        answer: str
+        sources: list[SourceItem]
+        session_id: str
+
+    class CourseStats(BaseModel):
+        total_courses: int
+        course_titles: list[str]
+
+    # API endpoints with mock system
+    @app.post("/api/query", response_model=QueryResponse)
+    async def query_documents(request: QueryRequest):
+        from fastapi import HTTPException
+
+        try:
+            # Use provided session_id or create new one
+            if request.session_id:
+                session_id = request.session_id
+            else:
+                session_id = mock_rag_system.session_manager.create_session()
+
+            answer, sources = await mock_rag_system.query(request.query, session_id)
+            return QueryResponse(answer=answer, sources=sources, session_id=session_id)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e)) from e
+
+    @app.post("/api/query/stream")
+    async def stream_query(request: QueryRequest):
+        import json
+
+        from fastapi.responses import StreamingResponse
+
+        session_id = request.session_id
+        if not session_id:
+            session_id = mock_rag_system.session_manager.create_session()
+
+        async def event_stream():
+            yield f"data: {json.dumps({'type': 'session', 'session_id': session_id})}\n\n"
+            try:
+                async for event in mock_rag_system.query_stream(
+                    request.query, session_id
+                ):
+                    yield f"data: {json.dumps(event)}\n\n"
+            except Exception as e:
+                yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    @app.get("/api/courses", response_model=CourseStats)
+    async def get_course_stats():
+        from fastapi import HTTPException
+
+        try:
+            analytics = mock_rag_system.get_course_analytics()
+            return CourseStats(
+                total_courses=analytics["total_courses"],
+                course_titles=analytics["course_titles"],
+            )
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e)) from e
+
+    @app.delete("/api/sessions/{session_id}")
+    async def clear_session(session_id: str):
+        from fastapi import HTTPException
+
+        try:
+            mock_rag_system.session_manager.clear_session(session_id)
+            return {"message": f"Session {session_id} cleared successfully"}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e)) from e
+
+    # Mount static files
+    app.mount("/", StaticFiles(directory=test_frontend_dir, html=True), name="static")
+
+    return app
+
+
+@pytest.fixture(scope="session")
+def _shared_test_client(test_app):
+    """TestClient built once; the app it wraps never changes between tests"""
+    from fastapi.testclient import TestClient
+
+    return TestClient(test_app)
+
+
+@pytest.fixture
+def test_client(_shared_test_client, mock_rag_system):
+    """Test client for the FastAPI app with freshly reset mocks"""
+    return _shared_test_client
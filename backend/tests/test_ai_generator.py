@@ -1,22 +1,125 @@
-from unittest.mock import Mock, patch
+import asyncio
+import threading
+from collections import deque
+from typing import Any
+from unittest.mock import AsyncMock, Mock
 
+import pytest
 from ai_generator import AIGenerator
+from search_tools import ToolManager
+
+from tests._fixtures import (
+    _Block,
+    _FakeMessageStream,
+    _Response,
+    _text_response,
+    _tool_use_response,
+)
+
+
+def make_tool_stub(results):
+    """execute_tool side effect returning each result in turn"""
+    remaining = iter(results)
+    return lambda tool_name, **kwargs: next(remaining)
+
+
+def last_kwargs(client):
+    """Keyword arguments of the client's most recent messages.create call"""
+    return client.messages.create.call_args.kwargs
+
+
+def tool_call(name, **kwargs):
+    """Hashable (name, sorted kwargs) key for comparing tool calls as a set"""
+    return name, tuple(sorted(kwargs.items()))
+
+
+# A scripted conversation is a list of rounds, each either
+# ("tool_use", [(tool_name, tool_input), ...]) or ("end_turn", text)
+Round = tuple[str, Any]
+Script = list[Round]
+
+
+def script_responses(script: Script) -> list:
+    """Build the responses messages.create returns for each round of the script"""
+    responses = []
+    for round_num, (stop_reason, payload) in enumerate(script, start=1):
+        if stop_reason == "tool_use":
+            responses.append(
+                _tool_use_response(
+                    *(
+                        (name, f"tool_{round_num}_{index}", tool_input)
+                        for index, (name, tool_input) in enumerate(payload)
+                    )
+                )
+            )
+        else:
+            responses.append(_text_response(payload, stop_reason))
+    return responses
+
+
+# Read-only tool definitions shared by every test; AIGenerator never mutates them
+SEARCH_TOOL = {"name": "search_course_content", "description": "Search course content"}
+OUTLINE_TOOL = {"name": "get_course_outline", "description": "Get course outline"}
+SEARCH_TOOLS = [SEARCH_TOOL]
+ALL_TOOLS = [OUTLINE_TOOL, SEARCH_TOOL]
+
+# Canned responses built once at import; the generator never mutates them
+SEARCH_ROUND = _tool_use_response(
+    ("search_course_content", "tool_1", {"query": "test"})
+)
+EMPTY_SEARCH_ROUND = _tool_use_response(
+    ("search_course_content", "tool_1", {"query": "quantum baking"})
+)
+OUTLINE_ROUND = _tool_use_response(
+    ("get_course_outline", "tool_1", {"course_title": "Python Basics"})
+)
+CONCURRENT_ROUND = _tool_use_response(
+    ("search_course_content", "tool_123", {"query": "Python"}),
+    ("get_course_outline", "tool_456", {"course_title": "Python Basics"}),
+)
+DUPLICATE_SEARCH_ROUND = _tool_use_response(
+    ("search_course_content", "tool_1", {"query": "MCP", "lesson_number": 1}),
+    ("search_course_content", "tool_2", {"lesson_number": 1, "query": "MCP"}),
+)
+REPEATED_SEARCH_ROUND = _tool_use_response(
+    ("search_course_content", "tool_3", {"query": "MCP", "lesson_number": 1})
+)
+PREAMBLE_OUTLINE_ROUND = _Response(
+    [
+        _Block("text", "Let me check the outline."),
+        _Block(
+            "tool_use",
+            name="get_course_outline",
+            id="tool_1",
+            input={"course_title": "Python Basics"},
+        ),
+    ],
+    "tool_use",
+)
+FINAL_ANSWER_RESPONSE = _text_response("Final answer")
+END_TURN_MESSAGE = _Response([], "end_turn")
+
+
+async def collect_events(stream):
+    """Drain an async event stream into a list"""
+    return [event async for event in stream]
 
 
 class TestAIGenerator:
     """Test AIGenerator tool calling functionality"""
 
-    def test_generate_response_without_tools(self, mock_anthropic_client):
+    def test_generate_response_without_tools(
+        self, mock_anthropic_client, ai_gen, use_client
+    ):
         """Test response generation without tools"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
 
         # Mock the client
-        with patch.object(ai_gen, "client", mock_anthropic_client):
-            response = ai_gen.generate_response("What is Python?")
+        use_client(mock_anthropic_client)
+        response = asyncio.run(ai_gen.generate_response("What is Python?"))
 
         # Verify client was called correctly
         mock_anthropic_client.messages.create.assert_called_once()
-        call_args = mock_anthropic_client.messages.create.call_args[1]
+        call_args = last_kwargs(mock_anthropic_client)
 
         # Check basic parameters
         assert call_args["model"] == "claude-sonnet-4-20250514"
@@ -26,80 +129,151 @@ class TestAIGenerator:
         assert call_args["messages"][0]["role"] == "user"
         assert call_args["messages"][0]["content"] == "What is Python?"
 
-        # Verify no tools were added
+        # Verify no tools were added and only the short general prompt is sent
         assert "tools" not in call_args
+        assert call_args["system"] == ai_gen.GENERAL_PROMPT
 
         # Check response
         assert response == "This is a test response"
 
-    def test_generate_response_with_conversation_history(self, mock_anthropic_client):
+    def test_generate_response_with_conversation_history(
+        self, mock_anthropic_client, ai_gen, use_client
+    ):
         """Test response generation with conversation history"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
-        history = "User: Hello\nAssistant: Hi there!"
+        history = [
+            {"role": "user", "content": "Hello"},
+            {"role": "assistant", "content": "Hi there!"},
+        ]
 
-        with patch.object(ai_gen, "client", mock_anthropic_client):
+        use_client(mock_anthropic_client)
+        asyncio.run(
             ai_gen.generate_response("How are you?", conversation_history=history)
+        )
+
+        call_args = last_kwargs(mock_anthropic_client)
+
+        # Verify history is prepended to messages with a breakpoint on the last turn
+        messages = call_args["messages"]
+        assert len(messages) == 3
+        assert messages[0] == {"role": "user", "content": "Hello"}
+        assert messages[1]["role"] == "assistant"
+        assert messages[1]["content"] == [
+            {
+                "type": "text",
+                "text": "Hi there!",
+                "cache_control": {"type": "ephemeral"},
+            }
+        ]
+        assert messages[2] == {"role": "user", "content": "How are you?"}
 
-        # Verify system prompt includes history
-        call_args = mock_anthropic_client.messages.create.call_args[1]
-        assert "Previous conversation:" in call_args["system"]
-        assert "User: Hello\nAssistant: Hi there!" in call_args["system"]
+        # Caller's history must not be mutated
+        assert history[1] == {"role": "assistant", "content": "Hi there!"}
 
-    def test_generate_response_with_tools_no_tool_use(self, mock_anthropic_client):
+    def test_generate_response_with_tools_no_tool_use(
+        self, mock_anthropic_client, ai_gen, use_client
+    ):
         """Test response generation with tools available but no tool use"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
 
         # Create mock tools
-        mock_tools = [{"name": "test_tool", "description": "A test tool"}]
-        mock_tool_manager = Mock()
+        mock_tool_manager = Mock(spec=ToolManager)
 
-        with patch.object(ai_gen, "client", mock_anthropic_client):
-            result = ai_gen.generate_response(
-                "What is Python?", tools=mock_tools, tool_manager=mock_tool_manager
+        use_client(mock_anthropic_client)
+        result = asyncio.run(
+            ai_gen.generate_response(
+                "What is Python?", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
             )
+        )
 
         # Should return tuple (response, sources) when tools are provided
         assert isinstance(result, tuple)
         response, sources = result
 
-        # Verify tools were added to the call
-        call_args = mock_anthropic_client.messages.create.call_args[1]
-        assert call_args["tools"] == mock_tools
-        assert call_args["tool_choice"] == {"type": "auto"}
+        # Verify tools were added to the call with a cache breakpoint on the last one
+        call_args = last_kwargs(mock_anthropic_client)
+        assert call_args["tools"] == [
+            {**SEARCH_TOOL, "cache_control": {"type": "ephemeral"}}
+        ]
+        assert "cache_control" not in SEARCH_TOOL
+        assert call_args["tool_choice"] == {
+            "type": "auto",
+            "disable_parallel_tool_use": False,
+        }
+
+        # Verify the system block is the cached static prompt only
+        assert call_args["system"] == [
+            {
+                "type": "text",
+                "text": ai_gen.SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"},
+            }
+        ]
 
         # Since no tool use, tool manager shouldn't be called
-        mock_tool_manager.execute_tool.assert_not_called()
+        mock_tool_manager.execute_tool_with_sources.assert_not_called()
 
         # Check response and empty sources
         assert response == "This is a test response"
         assert sources == []
 
-    def test_generate_response_with_tool_use(self, mock_anthropic_client_with_tool_use):
+    def test_generate_response_with_parallel_tool_use(
+        self, mock_anthropic_client_with_parallel_tool_use, ai_gen, use_client
+    ):
+        """Test that parallel tool_use blocks are all answered in a single round"""
+
+        mock_tool_manager = Mock(spec=ToolManager)
+        mock_tool_manager.execute_tool_with_sources.return_value = (
+            "Tool execution result",
+            [],
+        )
+
+        use_client(mock_anthropic_client_with_parallel_tool_use)
+        response, sources = asyncio.run(
+            ai_gen.generate_response(
+                "Compare lesson 1 of MCP with the Python Basics outline",
+                tools=ALL_TOOLS,
+                tool_manager=mock_tool_manager,
+            )
+        )
+
+        # Both tools ran before the single follow-up call
+        create = mock_anthropic_client_with_parallel_tool_use.messages.create
+        assert create.call_count == 2
+        assert mock_tool_manager.execute_tool_with_sources.call_count == 2
+
+        tool_result_message = create.call_args_list[1][1]["messages"][-1]
+        assert [r["tool_use_id"] for r in tool_result_message["content"]] == [
+            "tool_1",
+            "tool_2",
+        ]
+        assert response == "Response after parallel tool use"
+
+    def test_generate_response_with_tool_use(
+        self, mock_anthropic_client_with_tool_use, ai_gen, use_client
+    ):
         """Test response generation when AI decides to use a tool"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
 
         # Create mock tools and tool manager
-        mock_tools = [
-            {"name": "search_course_content", "description": "Search course content"}
-        ]
-        mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.return_value = "Tool execution result"
-        mock_tool_manager.get_last_sources.return_value = []
-        mock_tool_manager.reset_sources.return_value = None
+        mock_tool_manager = Mock(spec=ToolManager)
+        mock_tool_manager.execute_tool_with_sources.return_value = (
+            "Tool execution result",
+            [],
+        )
 
-        with patch.object(ai_gen, "client", mock_anthropic_client_with_tool_use):
-            result = ai_gen.generate_response(
+        use_client(mock_anthropic_client_with_tool_use)
+        result = asyncio.run(
+            ai_gen.generate_response(
                 "Find information about Python",
-                tools=mock_tools,
+                tools=SEARCH_TOOLS,
                 tool_manager=mock_tool_manager,
             )
+        )
 
         # Should return tuple (response, sources) when tools are provided
         assert isinstance(result, tuple)
         response, sources = result
 
         # Verify tool was executed
-        mock_tool_manager.execute_tool.assert_called_once_with(
+        mock_tool_manager.execute_tool_with_sources.assert_called_once_with(
             "search_course_content", query="test query"
         )
 
@@ -110,23 +284,41 @@ class TestAIGenerator:
         assert response == "Response after tool use"
         assert isinstance(sources, list)
 
-    def test_handle_tool_execution_single_tool(self):
-        """Test _handle_tool_execution with single tool call"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
+    @pytest.mark.parametrize(
+        "tool_inputs,expected_results",
+        [
+            pytest.param(
+                [("search_course_content", {"query": "Python basics"})],
+                ["Search results about Python"],
+                id="single",
+            ),
+            pytest.param(
+                [
+                    ("search_course_content", {"query": "Python"}),
+                    ("get_course_outline", {"course_title": "Python Basics"}),
+                ],
+                ["Search result 1", "Outline result"],
+                id="multi",
+            ),
+        ],
+    )
+    def test_handle_tool_execution(
+        self, tool_inputs, expected_results, ai_gen, use_client
+    ):
+        """Test _handle_tool_execution with one or several tool calls"""
 
-        # Mock initial response with tool use
-        mock_initial_response = Mock()
-        mock_initial_response.content = [Mock()]
-        mock_initial_response.content[0].type = "tool_use"
-        mock_initial_response.content[0].name = "search_course_content"
-        mock_initial_response.content[0].id = "tool_123"
-        mock_initial_response.content[0].input = {"query": "Python basics"}
+        # Initial response with one tool use block per input
+        initial_response = _tool_use_response(
+            *(
+                (tool_name, f"tool_{i}", tool_input)
+                for i, (tool_name, tool_input) in enumerate(tool_inputs)
+            )
+        )
 
         # Mock tool manager
-        mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.return_value = "Search results about Python"
+        mock_tool_manager = Mock(spec=ToolManager)
+        mock_tool_manager.execute_tool.side_effect = make_tool_stub(expected_results)
 
-        # Mock base parameters
         base_params = {
             "messages": [{"role": "user", "content": "Tell me about Python"}],
             "system": "You are a helpful assistant",
@@ -134,134 +326,161 @@ class TestAIGenerator:
 
         # Mock client for final call
         mock_client = Mock()
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Based on search results: Python is..."
-        mock_client.messages.create.return_value = mock_final_response
-
-        with patch.object(ai_gen, "client", mock_client):
-            result = ai_gen._handle_tool_execution(
-                mock_initial_response, base_params, mock_tool_manager
-            )
+        mock_client.messages.create = AsyncMock(
+            return_value=_text_response("Based on search results: Python is...")
+        )
 
-        # Verify tool was executed
-        mock_tool_manager.execute_tool.assert_called_once_with(
-            "search_course_content", query="Python basics"
+        use_client(mock_client)
+        result = asyncio.run(
+            ai_gen._handle_tool_execution(
+                initial_response, base_params, mock_tool_manager
+            )
         )
 
-        # Verify final API call structure
-        final_call_args = mock_client.messages.create.call_args[1]
-        assert (
-            len(final_call_args["messages"]) == 3
-        )  # original + assistant + tool result
+        # Verify every tool was executed in order
+        assert [
+            (c.args[0], c.kwargs) for c in mock_tool_manager.execute_tool.call_args_list
+        ] == tool_inputs
+
+        # Verify final API call structure: original + assistant + tool results
+        final_call_args = last_kwargs(mock_client)
+        assert len(final_call_args["messages"]) == 3
 
-        # Check tool result message format
         tool_result_message = final_call_args["messages"][2]
         assert tool_result_message["role"] == "user"
-        assert len(tool_result_message["content"]) == 1
-        assert tool_result_message["content"][0]["type"] == "tool_result"
-        assert tool_result_message["content"][0]["tool_use_id"] == "tool_123"
-        assert (
-            tool_result_message["content"][0]["content"]
-            == "Search results about Python"
-        )
+        assert tool_result_message["content"] == [
+            {"type": "tool_result", "tool_use_id": f"tool_{i}", "content": content}
+            for i, content in enumerate(expected_results)
+        ]
 
         assert result == "Based on search results: Python is..."
 
-    def test_handle_tool_execution_multiple_tools(self):
-        """Test _handle_tool_execution with multiple tool calls"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
+    def test_execute_tools_for_round_runs_tools_concurrently(self, ai_gen):
+        """Test that independent tool calls in one round run in parallel"""
 
-        # Mock initial response with multiple tool uses
-        mock_tool_use_1 = Mock()
-        mock_tool_use_1.type = "tool_use"
-        mock_tool_use_1.name = "search_course_content"
-        mock_tool_use_1.id = "tool_123"
-        mock_tool_use_1.input = {"query": "Python"}
+        # Both tools must be in flight at once to get past the barrier
+        barrier = threading.Barrier(2, timeout=5)
 
-        mock_tool_use_2 = Mock()
-        mock_tool_use_2.type = "tool_use"
-        mock_tool_use_2.name = "get_course_outline"
-        mock_tool_use_2.id = "tool_456"
-        mock_tool_use_2.input = {"course_title": "Python Basics"}
+        def execute_tool(tool_name, **kwargs):
+            barrier.wait()
+            return f"{tool_name} result", [{"text": tool_name, "link": None}]
 
-        mock_initial_response = Mock()
-        mock_initial_response.content = [mock_tool_use_1, mock_tool_use_2]
+        mock_tool_manager = Mock(spec=ToolManager)
+        mock_tool_manager.execute_tool_with_sources.side_effect = execute_tool
 
-        # Mock tool manager
-        mock_tool_manager = Mock()
-        mock_tool_manager.execute_tool.side_effect = [
-            "Search result 1",
-            "Outline result",
+        tool_results, sources = asyncio.run(
+            ai_gen._execute_tools_for_round(CONCURRENT_ROUND, mock_tool_manager)
+        )
+
+        # Results keep the order Claude requested them in
+        assert [r["tool_use_id"] for r in tool_results] == ["tool_123", "tool_456"]
+        assert tool_results[0]["content"] == "search_course_content result"
+        assert tool_results[1]["content"] == "get_course_outline result"
+
+        # Each result is paired with the sources from its own execution
+        assert [s["text"] for s in sources] == [
+            "search_course_content",
+            "get_course_outline",
         ]
 
-        base_params = {
-            "messages": [{"role": "user", "content": "Test query"}],
-            "system": "Test system",
-        }
+    def test_execute_tools_for_round_deduplicates_calls(self, ai_gen):
+        """Test that repeated tool calls within and across rounds run only once"""
 
-        # Mock client
-        mock_client = Mock()
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Combined results response"
-        mock_client.messages.create.return_value = mock_final_response
-
-        with patch.object(ai_gen, "client", mock_client):
-            result = ai_gen._handle_tool_execution(
-                mock_initial_response, base_params, mock_tool_manager
-            )
+        source = {"text": "MCP - Lesson 1", "link": None}
+        mock_tool_manager = Mock(spec=ToolManager)
+        mock_tool_manager.execute_tool_with_sources.return_value = (
+            "MCP lesson content",
+            [source],
+        )
 
-        # Verify both tools were executed
-        assert mock_tool_manager.execute_tool.call_count == 2
-        mock_tool_manager.execute_tool.assert_any_call(
-            "search_course_content", query="Python"
+        memo = {}
+        first_results, first_sources = asyncio.run(
+            ai_gen._execute_tools_for_round(
+                DUPLICATE_SEARCH_ROUND, mock_tool_manager, memo
+            )
         )
-        mock_tool_manager.execute_tool.assert_any_call(
-            "get_course_outline", course_title="Python Basics"
+        second_results, second_sources = asyncio.run(
+            ai_gen._execute_tools_for_round(
+                REPEATED_SEARCH_ROUND, mock_tool_manager, memo
+            )
         )
 
-        # Verify tool results structure
-        final_call_args = mock_client.messages.create.call_args[1]
-        tool_result_message = final_call_args["messages"][2]
-        assert len(tool_result_message["content"]) == 2  # Two tool results
-
-        assert result == "Combined results response"
+        # The search ran once; every tool_use_id still gets its own result
+        mock_tool_manager.execute_tool_with_sources.assert_called_once_with(
+            "search_course_content", query="MCP", lesson_number=1
+        )
+        assert [r["tool_use_id"] for r in first_results + second_results] == [
+            "tool_1",
+            "tool_2",
+            "tool_3",
+        ]
+        assert all(
+            r["content"] == "MCP lesson content" for r in first_results + second_results
+        )
+        assert first_sources == [source, source]
+        assert second_sources == [source]
+
+    def test_static_config(self, ai_gen):
+        """Test the base API parameters and the tool guidance in the system prompt"""
+        assert ai_gen.base_params == {
+            "model": "claude-sonnet-4-20250514",
+            "temperature": 0,
+            "max_tokens": 800,
+        }
 
-    def test_system_prompt_content(self):
-        """Test that the system prompt contains expected content"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        # Report every missing phrase at once rather than stopping at the first
+        expected = [
+            "search_course_content",
+            "get_course_outline",
+            "Tool Usage Guidelines",
+        ]
+        assert [
+            phrase for phrase in expected if phrase not in ai_gen.SYSTEM_PROMPT
+        ] == []
+
+    def test_client_shared_across_instances(self):
+        """Test that generators with the same API key reuse one HTTP client"""
+        first = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        second = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        other = AIGenerator("other-key", "claude-sonnet-4-20250514")
+
+        assert first.client is second.client
+        assert first.client is not other.client
+
+    def test_concurrent_requests_limited_per_generator(self):
+        """Test that in-flight requests are capped and the cap survives new loops"""
+        ai_gen = AIGenerator(
+            "test-key", "claude-sonnet-4-20250514", max_concurrent_requests=2
+        )
+        in_flight = []
+        peak = 0
 
-        # Check that system prompt contains tool usage guidelines
-        assert "search_course_content" in ai_gen.SYSTEM_PROMPT
-        assert "get_course_outline" in ai_gen.SYSTEM_PROMPT
-        assert "Tool Usage Guidelines" in ai_gen.SYSTEM_PROMPT
+        async def create(**kwargs):
+            nonlocal peak
+            in_flight.append(kwargs)
+            peak = max(peak, len(in_flight))
+            await asyncio.sleep(0)
+            in_flight.pop()
+            return FINAL_ANSWER_RESPONSE
 
-    def test_api_parameters_configuration(self):
-        """Test that API parameters are configured correctly"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        ai_gen.client = Mock()
+        ai_gen.client.messages.create = AsyncMock(side_effect=create)
 
-        # Check base parameters
-        assert ai_gen.base_params["model"] == "claude-sonnet-4-20250514"
-        assert ai_gen.base_params["temperature"] == 0
-        assert ai_gen.base_params["max_tokens"] == 800
+        async def burst():
+            await asyncio.gather(*(ai_gen._create_message({}) for _ in range(5)))
 
-    def test_error_handling_in_tool_execution(self):
-        """Test error handling when tool execution fails"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        # Each asyncio.run uses a fresh event loop
+        asyncio.run(burst())
+        asyncio.run(burst())
 
-        # Mock initial response with tool use
-        mock_tool_use = Mock()
-        mock_tool_use.type = "tool_use"
-        mock_tool_use.name = "search_course_content"
-        mock_tool_use.id = "tool_123"
-        mock_tool_use.input = {"query": "test"}
+        assert peak == 2
+        assert ai_gen.client.messages.create.call_count == 10
 
-        mock_initial_response = Mock()
-        mock_initial_response.content = [mock_tool_use]
+    def test_error_handling_in_tool_execution(self, ai_gen, use_client):
+        """Test that a failing tool aborts _handle_tool_execution with its error"""
 
         # Mock tool manager that raises exception
-        mock_tool_manager = Mock()
+        mock_tool_manager = Mock(spec=ToolManager)
         mock_tool_manager.execute_tool.side_effect = Exception("Tool execution failed")
 
         base_params = {
@@ -270,316 +489,403 @@ class TestAIGenerator:
         }
 
         mock_client = Mock()
-        mock_final_response = Mock()
-        mock_final_response.content = [Mock()]
-        mock_final_response.content[0].text = "Error handled response"
-        mock_client.messages.create.return_value = mock_final_response
-
-        with patch.object(ai_gen, "client", mock_client):
-            # This should not raise an exception, but handle it gracefully
-            try:
-                ai_gen._handle_tool_execution(
-                    mock_initial_response, base_params, mock_tool_manager
-                )
-                # The method should still try to get a final response
-                assert mock_client.messages.create.called
-            except Exception as e:
-                # If an exception is raised, it should be the original tool error
-                assert "Tool execution failed" in str(e)
-
-    def test_multi_round_tool_execution(
-        self, mock_anthropic_client_multi_round, mock_tool_manager_with_sources
-    ):
-        """Test multi-round tool execution with 2 rounds"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        mock_client.messages.create = AsyncMock()
 
-        mock_tools = [
-            {"name": "get_course_outline", "description": "Get course outline"},
-            {"name": "search_course_content", "description": "Search course content"},
-        ]
+        use_client(mock_client)
 
-        with patch.object(ai_gen, "client", mock_anthropic_client_multi_round):
-            result = ai_gen.generate_response(
-                "Find a course that discusses the same topic as lesson 2 of Python Basics",
-                tools=mock_tools,
-                tool_manager=mock_tool_manager_with_sources,
+        # The legacy single-round path lets the tool error propagate
+        with pytest.raises(Exception, match="Tool execution failed"):
+            asyncio.run(
+                ai_gen._handle_tool_execution(
+                    SEARCH_ROUND, base_params, mock_tool_manager
+                )
             )
 
-        # Should return tuple (response, sources)
-        assert isinstance(result, tuple)
-        response, sources = result
-
-        # Verify 3 API calls were made (round 1 tool use, round 2 tool use, final response)
-        assert mock_anthropic_client_multi_round.messages.create.call_count == 3
-
-        # Verify both tools were executed
-        assert mock_tool_manager_with_sources.execute_tool.call_count == 2
-        mock_tool_manager_with_sources.execute_tool.assert_any_call(
-            "get_course_outline", course_title="Python Basics"
-        )
-        mock_tool_manager_with_sources.execute_tool.assert_any_call(
-            "search_course_content", query="variables and data types"
-        )
-
-        # Verify sources were aggregated from both rounds
-        assert len(sources) == 2
-        assert any("Python Basics Course" in source["text"] for source in sources)
-        assert any("Python Basics - Lesson 2" in source["text"] for source in sources)
-
-        # Check final response
-        assert response == "Based on the course outline and search, here is the answer"
-
-    def test_multi_round_early_termination(
-        self, mock_anthropic_client_single_round_stop, mock_tool_manager_with_sources
+        # No follow-up request is sent once a tool has failed
+        mock_client.messages.create.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "scripted_anthropic_client, failing_tool, expected_calls, "
+        "expected_tool_calls, expected_text, expected_sources_len",
+        [
+            pytest.param(
+                script_responses(
+                    [
+                        (
+                            "tool_use",
+                            [("get_course_outline", {"course_title": "Python Basics"})],
+                        ),
+                        (
+                            "tool_use",
+                            [
+                                (
+                                    "search_course_content",
+                                    {"query": "variables and data types"},
+                                )
+                            ],
+                        ),
+                        (
+                            "end_turn",
+                            "Based on the course outline and search, here is the answer",
+                        ),
+                    ]
+                ),
+                None,
+                3,
+                {
+                    tool_call("get_course_outline", course_title="Python Basics"),
+                    tool_call(
+                        "search_course_content", query="variables and data types"
+                    ),
+                },
+                "Based on the course outline and search, here is the answer",
+                2,
+                id="tool_execution",
+            ),
+            pytest.param(
+                script_responses(
+                    [
+                        (
+                            "tool_use",
+                            [
+                                (
+                                    "get_course_outline",
+                                    {"course_title": "Python Basics"},
+                                ),
+                                ("search_course_content", {"query": "lesson 2 topics"}),
+                            ],
+                        ),
+                        ("end_turn", "Aggregated answer"),
+                    ]
+                ),
+                None,
+                2,
+                {
+                    tool_call("get_course_outline", course_title="Python Basics"),
+                    tool_call("search_course_content", query="lesson 2 topics"),
+                },
+                "Aggregated answer",
+                2,
+                id="source_aggregation",
+            ),
+            pytest.param(
+                script_responses(
+                    [
+                        (
+                            "tool_use",
+                            [("search_course_content", {"query": "Python basics"})],
+                        ),
+                        (
+                            "end_turn",
+                            "Here is the complete answer from the first search",
+                        ),
+                    ]
+                ),
+                None,
+                2,
+                {tool_call("search_course_content", query="Python basics")},
+                "Here is the complete answer from the first search",
+                1,
+                id="early_termination",
+            ),
+            pytest.param(
+                script_responses(
+                    [
+                        ("tool_use", [("search_course_content", {"query": "test_1"})]),
+                        ("tool_use", [("search_course_content", {"query": "test_2"})]),
+                        ("end_turn", "Final response after max rounds"),
+                        # Never requested - the wrap-up call above ends the conversation
+                        ("tool_use", [("search_course_content", {"query": "test_3"})]),
+                    ]
+                ),
+                None,
+                3,
+                {
+                    tool_call("search_course_content", query="test_1"),
+                    tool_call("search_course_content", query="test_2"),
+                },
+                "Final response after max rounds",
+                2,
+                id="max_rounds_limit",
+            ),
+            pytest.param(
+                script_responses(
+                    [
+                        (
+                            "tool_use",
+                            [
+                                ("search_course_content", {"query": "test"}),
+                                (
+                                    "get_course_outline",
+                                    {"course_title": "Python Basics"},
+                                ),
+                            ],
+                        ),
+                        ("end_turn", "Response despite tool error"),
+                    ]
+                ),
+                "get_course_outline",
+                2,
+                {
+                    tool_call("search_course_content", query="test"),
+                    tool_call("get_course_outline", course_title="Python Basics"),
+                },
+                "Response despite tool error",
+                1,
+                id="error_handling",
+            ),
+        ],
+        indirect=["scripted_anthropic_client"],
+    )
+    def test_multi_round_script(
+        self,
+        scripted_anthropic_client,
+        failing_tool,
+        expected_calls,
+        expected_tool_calls,
+        expected_text,
+        expected_sources_len,
+        mock_tool_manager_with_sources,
+        ai_gen,
+        use_client,
     ):
-        """Test that multi-round stops early when no more tools are needed"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
-
-        mock_tools = [
-            {"name": "search_course_content", "description": "Search course content"}
-        ]
+        """Test scripted multi-round conversations end with the expected answer"""
 
-        with patch.object(ai_gen, "client", mock_anthropic_client_single_round_stop):
-            result = ai_gen.generate_response(
-                "What is Python?",
-                tools=mock_tools,
-                tool_manager=mock_tool_manager_with_sources,
+        if failing_tool:
+            # The failing tool raises; every other tool still answers normally
+            execute_tool = (
+                mock_tool_manager_with_sources.execute_tool_with_sources.side_effect
             )
 
-        # Should return tuple (response, sources)
-        assert isinstance(result, tuple)
-        response, sources = result
+            def execute_or_fail(tool_name, **kwargs):
+                if tool_name == failing_tool:
+                    raise Exception("Tool execution failed")
+                return execute_tool(tool_name, **kwargs)
 
-        # Verify only 2 API calls were made (round 1 tool use, then stop)
-        assert mock_anthropic_client_single_round_stop.messages.create.call_count == 2
+            mock_tool_manager_with_sources.execute_tool_with_sources.side_effect = (
+                execute_or_fail
+            )
 
-        # Verify only one tool was executed
-        assert mock_tool_manager_with_sources.execute_tool.call_count == 1
-        mock_tool_manager_with_sources.execute_tool.assert_called_with(
-            "search_course_content", query="Python basics"
+        use_client(scripted_anthropic_client)
+        response, sources = asyncio.run(
+            ai_gen.generate_response(
+                "Test query",
+                tools=ALL_TOOLS,
+                tool_manager=mock_tool_manager_with_sources,
+            )
         )
 
-        # Check response
-        assert response == "Here is the complete answer from the first search"
+        assert scripted_anthropic_client.messages.create.call_count == expected_calls
+        # One snapshot of the calls, compared as a set since parallel tools race
+        tool_calls = (
+            mock_tool_manager_with_sources.execute_tool_with_sources.call_args_list
+        )
+        assert len(tool_calls) == len(expected_tool_calls)
+        assert {tool_call(c.args[0], **c.kwargs) for c in tool_calls} == (
+            expected_tool_calls
+        )
+        assert response == expected_text
+        assert len(sources) == expected_sources_len
 
-    def test_multi_round_context_preservation(self, mock_tool_manager_with_sources):
+    def test_multi_round_context_preservation(
+        self, mock_tool_manager_with_sources, ai_gen, use_client
+    ):
         """Test that conversation context is preserved across rounds"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
 
         # Mock client that tracks messages passed to it
         mock_client = Mock()
+        mock_client.messages.create = AsyncMock()
         messages_history = []
+        responses = deque([SEARCH_ROUND, FINAL_ANSWER_RESPONSE])
 
         def track_create_calls(**kwargs):
             messages_history.append(kwargs.get("messages", []).copy())
-
-            if len(messages_history) == 1:
-                # First call - return tool use
-                mock_response = Mock()
-                mock_response.stop_reason = "tool_use"
-                mock_tool = Mock()
-                mock_tool.type = "tool_use"
-                mock_tool.name = "search_course_content"
-                mock_tool.id = "tool_1"
-                mock_tool.input = {"query": "test"}
-                mock_response.content = [mock_tool]
-                return mock_response
-            else:
-                # Second call - return final response
-                mock_response = Mock()
-                mock_response.content = [Mock()]
-                mock_response.content[0].text = "Final answer"
-                mock_response.stop_reason = "end_turn"
-                return mock_response
+            return responses.popleft()
 
         mock_client.messages.create.side_effect = track_create_calls
 
-        mock_tools = [
-            {"name": "search_course_content", "description": "Search course content"}
-        ]
-
-        with patch.object(ai_gen, "client", mock_client):
+        use_client(mock_client)
+        asyncio.run(
             ai_gen.generate_response(
                 "Test query",
-                conversation_history="Previous: Hello\nAssistant: Hi there!",
-                tools=mock_tools,
+                conversation_history=[
+                    {"role": "user", "content": "Hello"},
+                    {"role": "assistant", "content": "Hi there!"},
+                ],
+                tools=SEARCH_TOOLS,
                 tool_manager=mock_tool_manager_with_sources,
             )
+        )
 
         # Verify conversation context was preserved
         assert len(messages_history) == 2
 
-        # First call should have original query only
+        # First call should have prior history followed by the original query
         first_messages = messages_history[0]
-        assert len(first_messages) == 1
+        assert len(first_messages) == 3
         assert first_messages[0]["role"] == "user"
-        assert first_messages[0]["content"] == "Test query"
+        assert first_messages[1]["role"] == "assistant"
+        assert first_messages[2]["role"] == "user"
+        assert first_messages[2]["content"] == "Test query"
 
-        # Second call should have: original query + assistant response + tool results
+        # Second call adds: assistant tool use response + tool results
         second_messages = messages_history[1]
-        assert len(second_messages) == 3
-        assert second_messages[0]["role"] == "user"  # Original query
-        assert second_messages[1]["role"] == "assistant"  # AI's tool use response
-        assert second_messages[2]["role"] == "user"  # Tool results
-
-    def test_multi_round_max_rounds_limit(self, mock_tool_manager_with_sources):
-        """Test that multi-round stops at maximum rounds limit"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        assert len(second_messages) == 5
+        assert second_messages[2]["role"] == "user"  # Original query
+        assert second_messages[3]["role"] == "assistant"  # AI's tool use response
+        assert second_messages[4]["role"] == "user"  # Tool results
+
+        # Only the latest tool result carries the round's cache breakpoint
+        assert second_messages[4]["content"][-1]["cache_control"] == {
+            "type": "ephemeral"
+        }
 
-        # Mock client that always returns tool use (would go infinite without limit)
-        mock_client = Mock()
-        call_count = 0
-
-        def always_tool_use(**kwargs):
-            nonlocal call_count
-            call_count += 1
-
-            if call_count <= 2:
-                # First two calls return tool use
-                mock_response = Mock()
-                mock_response.stop_reason = "tool_use"
-                mock_tool = Mock()
-                mock_tool.type = "tool_use"
-                mock_tool.name = "search_course_content"
-                mock_tool.id = f"tool_{call_count}"
-                mock_tool.input = {"query": f"test_{call_count}"}
-                mock_response.content = [mock_tool]
-                return mock_response
-            else:
-                # Final call (after max rounds) returns text response
-                mock_response = Mock()
-                mock_response.content = [Mock()]
-                mock_response.content[0].text = "Final response after max rounds"
-                mock_response.stop_reason = "end_turn"
-                return mock_response
-
-        mock_client.messages.create.side_effect = always_tool_use
-
-        mock_tools = [
-            {"name": "search_course_content", "description": "Search course content"}
-        ]
+    @pytest.mark.parametrize(
+        "scripted_anthropic_client",
+        [
+            [
+                _tool_use_response(
+                    ("search_course_content", "tool_1", {"query": "tool_1"})
+                ),
+                _tool_use_response(
+                    ("search_course_content", "tool_2", {"query": "tool_2"})
+                ),
+                _text_response("Summary"),
+            ]
+        ],
+        indirect=True,
+    )
+    def test_wrap_up_call_uses_router_model(
+        self, scripted_anthropic_client, mock_tool_manager_with_sources, monkeypatch
+    ):
+        """Test that tool rounds use the main model and the wrap-up uses the router"""
+        ai_gen = AIGenerator(
+            "test-key", "claude-sonnet-4-20250514", "claude-haiku-4-5-20251001"
+        )
 
-        with patch.object(ai_gen, "client", mock_client):
-            result = ai_gen.generate_response(
+        monkeypatch.setattr(ai_gen, "client", scripted_anthropic_client)
+        response, _ = asyncio.run(
+            ai_gen.generate_response(
                 "Test query",
-                tools=mock_tools,
+                tools=SEARCH_TOOLS,
                 tool_manager=mock_tool_manager_with_sources,
             )
+        )
 
-        # Should return tuple (response, sources)
-        assert isinstance(result, tuple)
-        response, sources = result
-
-        # Should make exactly 3 calls (2 rounds + 1 final)
-        assert call_count == 3
-
-        # Should execute exactly 2 tools (one per round)
-        assert mock_tool_manager_with_sources.execute_tool.call_count == 2
-
-        # Check final response
-        assert response == "Final response after max rounds"
-
-    def test_multi_round_source_aggregation(
-        self, mock_anthropic_client_multi_round, mock_tool_manager_with_sources
-    ):
-        """Test that sources are properly aggregated across multiple rounds"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
-
-        mock_tools = [
-            {"name": "get_course_outline", "description": "Get course outline"},
-            {"name": "search_course_content", "description": "Search course content"},
+        models = [
+            c[1]["model"]
+            for c in scripted_anthropic_client.messages.create.call_args_list
+        ]
+        assert models == [
+            "claude-sonnet-4-20250514",
+            "claude-sonnet-4-20250514",
+            "claude-haiku-4-5-20251001",
         ]
+        assert response == "Summary"
+
+    @pytest.mark.parametrize(
+        "scripted_anthropic_client",
+        [
+            [
+                _tool_use_response(
+                    ("search_course_content", "tool_1", {"query": "tool_1"})
+                ),
+                _Response(
+                    [
+                        _Block(
+                            "tool_use",
+                            name="search_course_content",
+                            id="tool_2",
+                            input={"query": "tool_2"},
+                        ),
+                        _Block("text", "Answer written before the results"),
+                    ],
+                    "tool_use",
+                ),
+                _text_response("Answer using the results"),
+            ]
+        ],
+        indirect=True,
+    )
+    def test_multi_round_wraps_up_when_text_follows_tools(
+        self,
+        scripted_anthropic_client,
+        mock_tool_manager_with_sources,
+        ai_gen,
+        use_client,
+    ):
+        """Test that text written alongside the last tool calls is not the answer"""
 
-        with patch.object(ai_gen, "client", mock_anthropic_client_multi_round):
-            result = ai_gen.generate_response(
-                "Multi-round query",
-                tools=mock_tools,
+        use_client(scripted_anthropic_client)
+        response, sources = asyncio.run(
+            ai_gen.generate_response(
+                "Test query",
+                tools=SEARCH_TOOLS,
                 tool_manager=mock_tool_manager_with_sources,
             )
+        )
 
-        # Should return tuple (response, sources)
-        assert isinstance(result, tuple)
-        response, sources = result
-
-        # Verify sources from both rounds are aggregated
+        # Claude had not seen the second round's results, so a wrap-up still runs
+        assert scripted_anthropic_client.messages.create.call_count == 3
+        assert response == "Answer using the results"
         assert len(sources) == 2
 
-        # Check sources contain data from both tool executions
-        source_texts = [source["text"] for source in sources]
-        assert "Python Basics Course" in source_texts
-        assert "Python Basics - Lesson 2" in source_texts
+    def test_multi_round_short_circuits_on_empty_results(
+        self, mock_anthropic_client, ai_gen, use_client
+    ):
+        """Test that empty tool results are returned without another API call"""
 
-        # Check links are preserved
-        source_links = [source.get("link") for source in sources]
-        assert "https://example.com/course" in source_links
-        assert "https://example.com/lesson/2" in source_links
+        mock_anthropic_client.messages.create.return_value = EMPTY_SEARCH_ROUND
 
-    def test_multi_round_error_handling(self, mock_tool_manager_with_sources):
-        """Test error handling during multi-round execution"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
+        mock_tool_manager = Mock(spec=ToolManager)
+        mock_tool_manager.execute_tool_with_sources.return_value = (
+            "No relevant content found.",
+            [],
+        )
 
-        # Mock client that has tool execution error in second round
-        mock_client = Mock()
-        call_count = 0
-
-        def error_in_second_round(**kwargs):
-            nonlocal call_count
-            call_count += 1
-
-            if call_count == 1:
-                # First call succeeds with tool use
-                mock_response = Mock()
-                mock_response.stop_reason = "tool_use"
-                mock_tool = Mock()
-                mock_tool.type = "tool_use"
-                mock_tool.name = "search_course_content"
-                mock_tool.id = "tool_1"
-                mock_tool.input = {"query": "test"}
-                mock_response.content = [mock_tool]
-                return mock_response
-            else:
-                # Second call returns final response
-                mock_response = Mock()
-                mock_response.content = [Mock()]
-                mock_response.content[0].text = "Response despite tool error"
-                mock_response.stop_reason = "end_turn"
-                return mock_response
-
-        # Make tool manager throw exception on second call
-        def tool_with_error(tool_name, **kwargs):
-            if mock_tool_manager_with_sources.execute_tool.call_count == 2:
-                raise Exception("Tool execution failed")
-            return "First tool succeeded"
-
-        mock_tool_manager_with_sources.execute_tool.side_effect = tool_with_error
-        mock_client.messages.create.side_effect = error_in_second_round
-
-        mock_tools = [
-            {"name": "search_course_content", "description": "Search course content"}
+        use_client(mock_anthropic_client)
+        response, sources = asyncio.run(
+            ai_gen.generate_response(
+                "Test query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+            )
+        )
+
+        mock_anthropic_client.messages.create.assert_called_once()
+        assert response == "No relevant content found."
+        assert sources == []
+
+    def test_multi_round_failed_tools_not_returned_verbatim(
+        self, mock_anthropic_client, ai_gen, use_client
+    ):
+        """Test that tool failures are summarized by Claude rather than leaked"""
+        mock_anthropic_client.messages.create.side_effect = [
+            SEARCH_ROUND,
+            _text_response("Sorry, the search is unavailable right now"),
         ]
 
-        with patch.object(ai_gen, "client", mock_client):
-            # Should handle error gracefully and not raise exception
-            result = ai_gen.generate_response(
-                "Test query",
-                tools=mock_tools,
-                tool_manager=mock_tool_manager_with_sources,
-            )
+        mock_tool_manager = Mock(spec=ToolManager)
+        mock_tool_manager.execute_tool_with_sources.side_effect = Exception(
+            "connection refused"
+        )
 
-        # Should still return tuple even with error
-        assert isinstance(result, tuple)
-        response, sources = result
+        use_client(mock_anthropic_client)
+        response, _ = asyncio.run(
+            ai_gen.generate_response(
+                "Test query", tools=SEARCH_TOOLS, tool_manager=mock_tool_manager
+            )
+        )
 
-        # Should continue conversation despite tool error
-        assert call_count == 2
-        assert response == "Response despite tool error"
+        assert mock_anthropic_client.messages.create.call_count == 2
+        assert "connection refused" not in response
+        assert response == "Sorry, the search is unavailable right now"
 
-    def test_backward_compatibility_without_tools(self, mock_anthropic_client):
+    def test_backward_compatibility_without_tools(
+        self, mock_anthropic_client, ai_gen, use_client
+    ):
         """Test that single-round behavior is preserved when no tools are provided"""
-        ai_gen = AIGenerator("test-key", "claude-sonnet-4-20250514")
 
-        with patch.object(ai_gen, "client", mock_anthropic_client):
-            result = ai_gen.generate_response("What is Python?")
+        use_client(mock_anthropic_client)
+        result = asyncio.run(ai_gen.generate_response("What is Python?"))
 
         # Should return just the response text (not a tuple) for backward compatibility
         assert isinstance(result, str)
@@ -589,5 +895,135 @@ class TestAIGenerator:
         mock_anthropic_client.messages.create.assert_called_once()
 
         # Verify no tools were passed in the call
-        call_args = mock_anthropic_client.messages.create.call_args[1]
+        call_args = last_kwargs(mock_anthropic_client)
         assert "tools" not in call_args
+
+    def test_generate_batch(self, mock_anthropic_client_batch, ai_gen, use_client):
+        """Test that batch results are polled for and returned in query order"""
+        queries = ["First?", "Second?", "Third?"]
+
+        use_client(mock_anthropic_client_batch)
+        responses = asyncio.run(ai_gen.generate_batch(queries, poll_interval=0))
+
+        assert responses == [
+            "Answer to first",
+            "Error: Batch request errored",
+            "Answer to third",
+        ]
+
+        # One single-shot request per query, without tools
+        requests = mock_anthropic_client_batch.messages.batches.create.call_args[1][
+            "requests"
+        ]
+        assert [r["custom_id"] for r in requests] == ["q-0", "q-1", "q-2"]
+        assert requests[1]["params"]["messages"] == [
+            {"role": "user", "content": "Second?"}
+        ]
+        assert "tools" not in requests[0]["params"]
+
+        mock_anthropic_client_batch.messages.batches.retrieve.assert_called_once_with(
+            "batch_123"
+        )
+
+    @pytest.mark.parametrize(
+        "tools, expected_texts",
+        [
+            pytest.param(None, ["Python ", "is great"], id="no_tools_streamed"),
+            pytest.param(SEARCH_TOOLS, ["Python is great"], id="tools_buffered"),
+        ],
+    )
+    def test_stream_response_without_tool_use(
+        self, ai_gen, use_client, tools, expected_texts
+    ):
+        """Test that text is emitted, then a sources event, when no tool is used"""
+
+        mock_client = Mock()
+        mock_client.messages.stream.return_value = _FakeMessageStream(
+            ["Python ", "is great"], END_TURN_MESSAGE
+        )
+
+        use_client(mock_client)
+        events = asyncio.run(
+            collect_events(
+                ai_gen.stream_response(
+                    "What is Python?",
+                    tools=tools,
+                    tool_manager=Mock(spec=ToolManager),
+                )
+            )
+        )
+
+        # A round that may call tools is only emitted once it ends the turn
+        assert events == [
+            *({"type": "text", "text": text} for text in expected_texts),
+            {"type": "sources", "sources": []},
+        ]
+        mock_client.messages.stream.assert_called_once()
+
+    def test_stream_response_drops_tool_round_preamble(
+        self, mock_tool_manager_with_sources, ai_gen, use_client
+    ):
+        """Test that text written before a tool_use block is not streamed"""
+
+        mock_client = Mock()
+        mock_client.messages.stream.side_effect = [
+            _FakeMessageStream(["Let me check the outline."], PREAMBLE_OUTLINE_ROUND),
+            _FakeMessageStream(["Outline answer"], _text_response("Outline answer")),
+        ]
+
+        use_client(mock_client)
+        events = asyncio.run(
+            collect_events(
+                ai_gen.stream_response(
+                    "Outline of Python Basics?",
+                    tools=[OUTLINE_TOOL],
+                    tool_manager=mock_tool_manager_with_sources,
+                )
+            )
+        )
+
+        assert [e["text"] for e in events if e["type"] == "text"] == ["Outline answer"]
+
+    def test_stream_response_with_tool_round(
+        self, mock_tool_manager_with_sources, ai_gen, use_client
+    ):
+        """Test that tool rounds run between streamed calls and sources are emitted"""
+
+        mock_client = Mock()
+        mock_client.messages.stream.side_effect = [
+            _FakeMessageStream([], OUTLINE_ROUND),
+            _FakeMessageStream(["Outline answer"], END_TURN_MESSAGE),
+        ]
+
+        use_client(mock_client)
+        events = asyncio.run(
+            collect_events(
+                ai_gen.stream_response(
+                    "Outline of Python Basics?",
+                    tools=[OUTLINE_TOOL],
+                    tool_manager=mock_tool_manager_with_sources,
+                )
+            )
+        )
+
+        mock_tool_manager_with_sources.execute_tool_with_sources.assert_called_once_with(
+            "get_course_outline", course_title="Python Basics"
+        )
+        assert mock_client.messages.stream.call_count == 2
+
+        # Second round sees the assistant tool use and the tool results
+        second_messages = mock_client.messages.stream.call_args_list[1][1]["messages"]
+        assert [m["role"] for m in second_messages] == ["user", "assistant", "user"]
+
+        assert events == [
+            {"type": "text", "text": "Outline answer"},
+            {
+                "type": "sources",
+                "sources": [
+                    {
+                        "text": "Python Basics Course",
+                        "link": "https://example.com/course",
+                    }
+                ],
+            },
+        ]
@@ -1,52 +1,75 @@
-import pytest
+import asyncio
 import json
-from unittest.mock import Mock, patch
-from fastapi.testclient import TestClient
-from fastapi import HTTPException
+from operator import attrgetter
 
+import httpx
+import pytest
 
-@pytest.mark.api
-class TestQueryEndpoint:
-    """Test cases for the /api/query endpoint"""
+# Query for an existing session; tests only read it, so one dict is shared
+SAMPLE_QUERY_REQUEST = {
+    "query": "What is Python programming?",
+    "session_id": "test-session-123",
+}
 
-    def test_successful_query_with_session(self, test_client, sample_query_request):
-        """Test successful query with existing session ID"""
-        response = test_client.post("/api/query", json=sample_query_request)
+# ~1.6KB query - the RAG system is mocked, so this only exercises request parsing
+LARGE_QUERY = "What is Python? " * 100
 
-        assert response.status_code == 200
-        data = response.json()
 
-        assert "answer" in data
-        assert "sources" in data
-        assert "session_id" in data
-        assert data["session_id"] == "test-session-123"
-        assert isinstance(data["sources"], list)
+def _assert_query_envelope(data, expected_session=None):
+    """Check the fields every successful /api/query response carries"""
+    assert {"answer", "sources", "session_id"} <= data.keys()
+    assert isinstance(data["answer"], str)
+    assert isinstance(data["session_id"], str)
 
-        # Check source structure
-        if data["sources"]:
-            source = data["sources"][0]
-            assert "text" in source
-            assert "link" in source
+    # Each source carries display text and an optional link
+    sources = data["sources"]
+    assert isinstance(sources, list)
+    for source in sources:
+        assert {"text", "link"} <= source.keys()
 
-    def test_successful_query_without_session(self, test_client, sample_query_request_no_session):
-        """Test successful query without session ID (should create new session)"""
-        response = test_client.post("/api/query", json=sample_query_request_no_session)
+    # Session IDs should be preserved when provided
+    if expected_session is not None:
+        assert data["session_id"] == expected_session
 
-        assert response.status_code == 200
-        data = response.json()
 
-        assert "answer" in data
-        assert "sources" in data
-        assert "session_id" in data
-        assert data["session_id"] == "test-session-123"  # Mock returns this value
+@pytest.mark.api
+class TestQueryEndpoint:
+    """Test cases for the /api/query endpoint"""
+
+    @pytest.mark.parametrize(
+        "payload,expected_session",
+        [
+            pytest.param(SAMPLE_QUERY_REQUEST, "test-session-123", id="with_session"),
+            pytest.param(
+                {"query": "What are variables in Python?"},
+                "test-session-123",
+                id="new_session",
+            ),  # Mock creates this ID
+            pytest.param(
+                {"query": "Test query 1", "session_id": "session-1"},
+                "session-1",
+                id="session_1",
+            ),
+            pytest.param(
+                {"query": "Test query 2", "session_id": "session-2"},
+                "session-2",
+                id="session_2",
+            ),
+        ],
+    )
+    def test_query_envelope(self, test_client, payload, expected_session):
+        """Test that a successful query returns the full response envelope"""
+        response = test_client.post("/api/query", json=payload)
+
+        assert response.status_code == 200
+        _assert_query_envelope(response.json(), expected_session)
 
     def test_query_with_empty_query(self, test_client):
         """Test query with empty query string"""
         response = test_client.post("/api/query", json={"query": ""})
 
         assert response.status_code == 200  # Should still succeed with mock
-        data = response.json()
-        assert "answer" in data
+        _assert_query_envelope(response.json())
 
     def test_query_with_invalid_json(self, test_client):
         """Test query with invalid JSON structure"""
@@ -60,118 +83,99 @@ class TestQueryEndpoint:
 
         assert response.status_code == 422
 
-    def test_query_rag_system_error(self, test_client, mock_rag_system, sample_query_request):
-        """Test query when RAG system raises an exception"""
-        # Reset the mock and configure it to raise an exception
-        mock_rag_system.query.side_effect = Exception("RAG system error")
 
-        response = test_client.post("/api/query", json=sample_query_request)
+def _read_events(response):
+    """Decode the JSON payload of every server-sent event in a response"""
+    return [
+        json.loads(line.removeprefix("data: "))
+        for line in response.text.splitlines()
+        if line.startswith("data: ")
+    ]
 
-        assert response.status_code == 500
-        assert "RAG system error" in response.json()["detail"]
 
-        # Reset the mock for other tests
-        mock_rag_system.query.side_effect = None
+@pytest.mark.api
+class TestQueryStreamEndpoint:
+    """Test cases for the /api/query/stream endpoint"""
 
-    def test_query_response_structure(self, test_client, sample_query_request):
-        """Test that query response matches expected structure"""
-        response = test_client.post("/api/query", json=sample_query_request)
+    def test_stream_event_sequence(self, test_client, mock_rag_system):
+        """Test that the session event precedes the text deltas and sources"""
+        response = test_client.post("/api/query/stream", json=SAMPLE_QUERY_REQUEST)
 
         assert response.status_code == 200
-        data = response.json()
-
-        # Validate response structure
-        required_fields = ["answer", "sources", "session_id"]
-        for field in required_fields:
-            assert field in data
-
-        assert isinstance(data["answer"], str)
-        assert isinstance(data["sources"], list)
-        assert isinstance(data["session_id"], str)
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = _read_events(response)
+        assert [event["type"] for event in events] == [
+            "session",
+            "text",
+            "text",
+            "sources",
+        ]
+        assert events[0]["session_id"] == "test-session-123"
+        assert "".join(e["text"] for e in events if e["type"] == "text") == (
+            "Python is a programming language"
+        )
+        assert events[-1]["sources"][0]["text"] == "Python Basics - Lesson 1"
+        mock_rag_system.query_stream.assert_called_once_with(
+            SAMPLE_QUERY_REQUEST["query"], "test-session-123"
+        )
+
+    def test_stream_creates_session(self, test_client, mock_rag_system):
+        """Test that a session is created when none is provided"""
+        mock_rag_system.session_manager.create_session.return_value = "new-session"
+
+        response = test_client.post("/api/query/stream", json={"query": "Test"})
+
+        assert _read_events(response)[0] == {
+            "type": "session",
+            "session_id": "new-session",
+        }
 
-    def test_query_different_session_ids(self, test_client):
-        """Test queries with different session IDs"""
-        query1 = {"query": "Test query 1", "session_id": "session-1"}
-        query2 = {"query": "Test query 2", "session_id": "session-2"}
+    def test_stream_error_event(self, test_client, mock_rag_system):
+        """Test that a failure mid-stream ends the stream with an error event"""
 
-        response1 = test_client.post("/api/query", json=query1)
-        response2 = test_client.post("/api/query", json=query2)
+        async def failing_stream(query, session_id=None):
+            yield {"type": "text", "text": "Partial "}
+            raise Exception("Stream failed")
 
-        assert response1.status_code == 200
-        assert response2.status_code == 200
+        mock_rag_system.query_stream.side_effect = failing_stream
 
-        # Both should succeed with their respective session IDs
-        data1 = response1.json()
-        data2 = response2.json()
+        response = test_client.post("/api/query/stream", json=SAMPLE_QUERY_REQUEST)
 
-        # Session IDs should be preserved when provided
-        assert data1["session_id"] == "session-1"
-        assert data2["session_id"] == "session-2"
+        assert response.status_code == 200
+        events = _read_events(response)
+        assert [event["type"] for event in events] == ["session", "text", "error"]
+        assert events[-1]["message"] == "Stream failed"
 
 
 @pytest.mark.api
 class TestCoursesEndpoint:
     """Test cases for the /api/courses endpoint"""
 
-    def test_get_course_stats_success(self, test_client):
-        """Test successful retrieval of course statistics"""
-        response = test_client.get("/api/courses")
-
-        assert response.status_code == 200
-        data = response.json()
-
-        assert "total_courses" in data
-        assert "course_titles" in data
-        assert isinstance(data["total_courses"], int)
-        assert isinstance(data["course_titles"], list)
-
-        # Check mock data
-        assert data["total_courses"] == 2
-        assert "Python Basics" in data["course_titles"]
-        assert "JavaScript Fundamentals" in data["course_titles"]
-
-    def test_get_course_stats_rag_system_error(self, test_client, mock_rag_system):
-        """Test course stats when RAG system raises an exception"""
-        # Configure mock to raise an exception
-        mock_rag_system.get_course_analytics.side_effect = Exception("Analytics error")
-
-        response = test_client.get("/api/courses")
-
-        assert response.status_code == 500
-        assert "Analytics error" in response.json()["detail"]
-
-        # Reset the mock for other tests
-        mock_rag_system.get_course_analytics.side_effect = None
+    @pytest.mark.parametrize(
+        "analytics",
+        [
+            pytest.param(None, id="default"),  # Keep the fixture's two mock courses
+            pytest.param({"total_courses": 0, "course_titles": []}, id="empty"),
+        ],
+    )
+    def test_get_course_stats_envelope(self, test_client, mock_rag_system, analytics):
+        """Test that course statistics match the analytics returned by the RAG system"""
+        if analytics is not None:
+            mock_rag_system.get_course_analytics.return_value = analytics
+        expected = mock_rag_system.get_course_analytics.return_value
 
-    def test_get_course_stats_response_structure(self, test_client):
-        """Test that course stats response matches expected structure"""
         response = test_client.get("/api/courses")
 
         assert response.status_code == 200
         data = response.json()
 
         # Validate response structure
-        required_fields = ["total_courses", "course_titles"]
-        for field in required_fields:
-            assert field in data
-
-        assert data["total_courses"] >= 0
+        assert isinstance(data["total_courses"], int)
+        assert isinstance(data["course_titles"], list)
         assert len(data["course_titles"]) == data["total_courses"]
 
-    def test_get_course_stats_empty_courses(self, test_client, mock_rag_system):
-        """Test course stats when no courses are available"""
-        # Configure mock to return empty data
-        mock_rag_system.get_course_analytics.return_value = {
-            "total_courses": 0,
-            "course_titles": []
-        }
-
-        response = test_client.get("/api/courses")
-
-        assert response.status_code == 200
-        data = response.json()
-        assert data["total_courses"] == 0
-        assert data["course_titles"] == []
+        assert data == expected
 
 
 @pytest.mark.api
@@ -199,20 +203,6 @@ class TestSessionsEndpoint:
         data = response.json()
         assert session_id in data["message"]
 
-    def test_clear_session_rag_system_error(self, test_client, mock_rag_system):
-        """Test session clearing when RAG system raises an exception"""
-        # Configure mock to raise an exception
-        mock_rag_system.session_manager.clear_session.side_effect = Exception("Session error")
-
-        session_id = "error-session"
-        response = test_client.delete(f"/api/sessions/{session_id}")
-
-        assert response.status_code == 500
-        assert "Session error" in response.json()["detail"]
-
-        # Reset the mock for other tests
-        mock_rag_system.session_manager.clear_session.side_effect = None
-
     def test_clear_nonexistent_session(self, test_client):
         """Test clearing a session that doesn't exist"""
         session_id = "nonexistent-session"
@@ -226,50 +216,45 @@ class TestSessionsEndpoint:
 class TestStaticFileServing:
     """Test cases for static file serving"""
 
-    def test_serve_index_html(self, test_client):
-        """Test serving the main index.html file"""
-        response = test_client.get("/")
-
-        assert response.status_code == 200
-        assert "text/html" in response.headers["content-type"]
-        assert "Test RAG System" in response.text
-
-    def test_serve_css_file(self, test_client):
-        """Test serving CSS files"""
-        response = test_client.get("/styles.css")
-
-        assert response.status_code == 200
-        assert "text/css" in response.headers["content-type"]
-        assert "Arial" in response.text
-
-    def test_serve_nonexistent_file(self, test_client):
-        """Test serving a file that doesn't exist"""
-        response = test_client.get("/nonexistent.html")
-
-        assert response.status_code == 404
-
-    def test_serve_root_path_variations(self, test_client):
-        """Test different ways of accessing the root path"""
-        paths = ["/", "/index.html"]
-
-        for path in paths:
-            response = test_client.get(path)
-            assert response.status_code == 200
-            assert "Test RAG System" in response.text
+    @pytest.mark.parametrize(
+        "path,expected_status,expected_type,expected_snippet",
+        [
+            pytest.param("/", 200, "text/html", "Test RAG System", id="root"),
+            pytest.param(
+                "/index.html", 200, "text/html", "Test RAG System", id="index"
+            ),
+            pytest.param("/styles.css", 200, "text/css", "Arial", id="css"),
+            pytest.param("/nonexistent.html", 404, None, None, id="missing"),
+        ],
+    )
+    def test_serve_static_file(
+        self, test_client, path, expected_status, expected_type, expected_snippet
+    ):
+        """Test serving frontend files, including the root index and missing files"""
+        response = test_client.get(path)
+
+        assert response.status_code == expected_status
+        if expected_type:
+            assert expected_type in response.headers["content-type"]
+        if expected_snippet:
+            assert expected_snippet in response.text
 
 
 @pytest.mark.api
 class TestAPIIntegration:
     """Integration tests for API endpoints"""
 
+    @pytest.mark.slow
     def test_api_workflow_complete_session(self, test_client, mock_rag_system):
         """Test a complete API workflow: query -> get courses -> clear session"""
         # Step 1: Make a query
-        query_response = test_client.post("/api/query", json={
-            "query": "What is Python?"
-        })
+        query_response = test_client.post(
+            "/api/query", json={"query": "What is Python?"}
+        )
         assert query_response.status_code == 200
-        session_id = query_response.json()["session_id"]
+        data = query_response.json()
+        _assert_query_envelope(data)
+        session_id = data["session_id"]
 
         # Step 2: Get course statistics
         courses_response = test_client.get("/api/courses")
@@ -279,46 +264,60 @@ class TestAPIIntegration:
         clear_response = test_client.delete(f"/api/sessions/{session_id}")
         assert clear_response.status_code == 200
 
-    def test_api_cors_headers(self, test_client):
-        """Test that CORS middleware is properly configured"""
-        # Test that the app accepts cross-origin requests
-        response = test_client.post("/api/query",
-                                   json={"query": "test"},
-                                   headers={"Origin": "http://localhost:3000"})
+    def test_api_cors_headers(self, test_client, mock_rag_system):
+        """Test that CORS middleware answers preflight requests for the API"""
+        origin = "http://localhost:3000"
+        response = test_client.options(
+            "/api/query",
+            headers={"Origin": origin, "Access-Control-Request-Method": "POST"},
+        )
 
         assert response.status_code == 200
-        # CORS headers may not always be visible in test client
+        # Credentials are allowed, so the wildcard origin is echoed back explicitly
+        assert response.headers["access-control-allow-origin"] == origin
+        assert "POST" in response.headers["access-control-allow-methods"]
 
-    def test_api_content_types(self, test_client, sample_query_request):
+        # The preflight is answered by the middleware without reaching the endpoint
+        mock_rag_system.query.assert_not_called()
+
+    def test_api_content_types(self, test_client):
         """Test that API endpoints return proper content types"""
         # JSON endpoints should return JSON content-type
-        response = test_client.post("/api/query", json=sample_query_request)
+        response = test_client.post("/api/query", json=SAMPLE_QUERY_REQUEST)
         assert "application/json" in response.headers["content-type"]
 
         response = test_client.get("/api/courses")
         assert "application/json" in response.headers["content-type"]
 
-    def test_api_error_handling_consistency(self, test_client, mock_rag_system):
-        """Test that all endpoints handle errors consistently"""
-        # Configure mocks to raise exceptions
-        mock_rag_system.query.side_effect = Exception("Query error")
-        mock_rag_system.get_course_analytics.side_effect = Exception("Analytics error")
-        mock_rag_system.session_manager.clear_session.side_effect = Exception("Session error")
-
-        # Test all endpoints return 500 for system errors
-        query_response = test_client.post("/api/query", json={"query": "test"})
-        assert query_response.status_code == 500
-
-        courses_response = test_client.get("/api/courses")
-        assert courses_response.status_code == 500
-
-        session_response = test_client.delete("/api/sessions/test")
-        assert session_response.status_code == 500
+    @pytest.mark.parametrize(
+        "attr,method,url,kwargs",
+        [
+            pytest.param(
+                "query", "post", "/api/query", {"json": {"query": "test"}}, id="query"
+            ),
+            pytest.param(
+                "get_course_analytics", "get", "/api/courses", {}, id="courses"
+            ),
+            pytest.param(
+                "session_manager.clear_session",
+                "delete",
+                "/api/sessions/test",
+                {},
+                id="sessions",
+            ),
+        ],
+    )
+    def test_api_error_handling_consistency(
+        self, test_client, mock_rag_system, attr, method, url, kwargs
+    ):
+        """Test that every endpoint turns a RAG system error into a 500 with its message"""
+        # Configure the one mock this endpoint depends on to raise an exception
+        attrgetter(attr)(mock_rag_system).side_effect = Exception(f"{attr} error")
+
+        response = getattr(test_client, method)(url, **kwargs)
 
-        # Reset all mocks for other tests
-        mock_rag_system.query.side_effect = None
-        mock_rag_system.get_course_analytics.side_effect = None
-        mock_rag_system.session_manager.clear_session.side_effect = None
+        assert response.status_code == 500
+        assert f"{attr} error" in response.json()["detail"]
 
 
 @pytest.mark.api
@@ -326,31 +325,34 @@ class TestAPIIntegration:
 class TestAPIPerformance:
     """Performance-related tests for API endpoints"""
 
-    def test_concurrent_queries(self, test_client):
+    def test_concurrent_queries(self, test_app, mock_rag_system):
         """Test multiple concurrent queries to the same endpoint"""
-        import concurrent.futures
-        import threading
-
-        def make_query(query_id):
-            return test_client.post("/api/query", json={
-                "query": f"Test query {query_id}"
-            })
 
-        # Test with multiple concurrent requests
-        with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-            futures = [executor.submit(make_query, i) for i in range(10)]
-            results = [future.result() for future in concurrent.futures.as_completed(futures)]
+        # TestClient serializes requests, so drive the app in-process with asyncio instead
+        async def make_queries():
+            transport = httpx.ASGITransport(app=test_app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                return await asyncio.gather(
+                    *[
+                        client.post(
+                            "/api/query", json={"query": f"Test query {query_id}"}
+                        )
+                        for query_id in range(10)
+                    ]
+                )
+
+        results = asyncio.run(make_queries())
 
         # All requests should succeed
         for response in results:
             assert response.status_code == 200
+        assert mock_rag_system.query.call_count == 10
 
-    def test_large_query_handling(self, test_client):
+    def test_large_query_handling(self, test_client, mock_rag_system):
         """Test handling of large query strings"""
-        large_query = "What is Python? " * 1000  # ~14KB query
+        response = test_client.post("/api/query", json={"query": LARGE_QUERY})
 
-        response = test_client.post("/api/query", json={
-            "query": large_query
-        })
-
-        assert response.status_code == 200
\ No newline at end of file
+        assert response.status_code == 200
+        assert mock_rag_system.query.call_args[0][0] == LARGE_QUERY
@@ -1,4 +1,4 @@
-from search_tools import CourseSearchTool
+from search_tools import CourseSearchTool, ToolManager
 from vector_store import SearchResults
 
 
@@ -83,6 +83,13 @@ class TestCourseSearchTool:
         # Should return the error message
         assert "ChromaDB connection failed" in result
 
+    def test_execute_returns_text_for_every_store_mode(self, any_vector_store):
+        """Test that execute always returns a non-empty string for Claude"""
+        result = CourseSearchTool(any_vector_store).execute("test query")
+
+        assert isinstance(result, str)
+        assert result
+
     def test_get_tool_definition(self, course_search_tool):
         """Test that tool definition is correctly formatted"""
         definition = course_search_tool.get_tool_definition()
@@ -104,7 +111,9 @@ class TestCourseSearchTool:
     def test_format_results_with_lesson_link(self, mock_vector_store):
         """Test result formatting with lesson links"""
         # Setup mock to return lesson link
-        mock_vector_store.get_lesson_link.return_value = "https://example.com/lesson/5"
+        mock_vector_store.get_lesson_links.return_value = {
+            ("Advanced Python", 5): "https://example.com/lesson/5"
+        }
 
         # Setup search results with lesson number
         mock_results = SearchResults(
@@ -118,7 +127,9 @@ class TestCourseSearchTool:
         tool.execute("advanced concepts")
 
         # Verify lesson link was requested
-        mock_vector_store.get_lesson_link.assert_called_once_with("Advanced Python", 5)
+        mock_vector_store.get_lesson_links.assert_called_once_with(
+            [("Advanced Python", 5)]
+        )
 
         # Verify sources include link
         assert len(tool.last_sources) == 1
@@ -158,10 +169,10 @@ class TestCourseSearchTool:
             distances=[0.1, 0.2],
         )
         mock_vector_store.search.return_value = mock_results
-        mock_vector_store.get_lesson_link.side_effect = [
-            "https://example.com/course-a/lesson/1",
-            "https://example.com/course-b/lesson/2",
-        ]
+        mock_vector_store.get_lesson_links.return_value = {
+            ("Course A", 1): "https://example.com/course-a/lesson/1",
+            ("Course B", 2): "https://example.com/course-b/lesson/2",
+        }
 
         tool = CourseSearchTool(mock_vector_store)
         result = tool.execute("test query")
@@ -177,6 +188,42 @@ class TestCourseSearchTool:
         assert tool.last_sources[0]["text"] == "Course A - Lesson 1"
         assert tool.last_sources[1]["text"] == "Course B - Lesson 2"
 
+        # Links for all results come from a single store lookup
+        mock_vector_store.get_lesson_links.assert_called_once_with(
+            [("Course A", 1), ("Course B", 2)]
+        )
+        assert tool.last_sources[1]["link"] == "https://example.com/course-b/lesson/2"
+
+    def test_execute_with_sources_returns_sources(self, course_search_tool):
+        """Test that sources come back with the result instead of via shared state"""
+        course_search_tool.last_sources = [{"text": "Earlier search", "link": None}]
+
+        result, sources = course_search_tool.execute_with_sources("worker query")
+
+        assert "Python Basics" in result
+        assert sources == [
+            {"text": "Python Basics - Lesson 1", "link": "https://example.com/lesson/1"}
+        ]
+        assert course_search_tool.last_sources == [
+            {"text": "Earlier search", "link": None}
+        ]
+
+    def test_tool_manager_execute_with_sources(self, course_search_tool):
+        """Test that ToolManager returns each tool's sources alongside its result"""
+        manager = ToolManager()
+        manager.register_tool(course_search_tool)
+
+        result, sources = manager.execute_tool_with_sources(
+            "search_course_content", query="test"
+        )
+
+        assert "Python Basics" in result
+        assert sources[0]["text"] == "Python Basics - Lesson 1"
+        assert manager.execute_tool_with_sources("missing_tool") == (
+            "Tool 'missing_tool' not found",
+            [],
+        )
+
     def test_sources_reset_between_searches(self, course_search_tool):
         """Test that sources are reset between different searches"""
         # First search
@@ -190,9 +237,9 @@ class TestCourseSearchTool:
             distances=[0.4],
         )
         course_search_tool.store.search.return_value = mock_results
-        course_search_tool.store.get_lesson_link.return_value = (
-            "https://example.com/different/3"
-        )
+        course_search_tool.store.get_lesson_links.return_value = {
+            ("Different Course", 3): "https://example.com/different/3"
+        }
 
         course_search_tool.execute("second query")
 
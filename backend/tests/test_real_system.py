@@ -1,246 +1,284 @@
+import asyncio
+import hashlib
+import importlib.util
+import logging
 import os
-import shutil
-import tempfile
+import re
+from pathlib import Path
 
+import anthropic
+import httpx
+import numpy as np
 import pytest
 from config import Config
 from rag_system import RAGSystem
 
+logger = logging.getLogger(__name__)
+
+# Needs the real chromadb and anthropic packages instead of the conftest stand-ins
+pytestmark = pytest.mark.skipif(
+    os.environ.get("RAG_TESTS_USE_REAL_DEPS") != "1",
+    reason="set RAG_TESTS_USE_REAL_DEPS=1 to run real-system integration tests",
+)
+
+
+# Course scripts, relative to backend/ like the app's startup loader; scanned once
+DOCS_PATH = "../docs"
+DOCS_AVAILABLE = os.path.isdir(DOCS_PATH)
+DOCS_FILES = (
+    sorted(
+        entry.name
+        for entry in os.scandir(DOCS_PATH)
+        if entry.is_file() and entry.name.endswith(".txt")
+    )
+    if DOCS_AVAILABLE
+    else []
+)
+
+# Documents ingested by loaded_rag_system; the tests check behavior, not scale
+MAX_TEST_FILES = int(os.environ.get("RAG_TEST_MAX_FILES", "2"))
+
+
+@pytest.fixture(scope="session")
+def real_test_config():
+    """Create config for real system testing with an in-memory ChromaDB"""
+    config = Config()
+    config.CHROMA_IN_MEMORY = True  # Nothing here needs to outlive the session
+    config.ANTHROPIC_API_KEY = "test-key"  # This will fail but let's see where
+    return config
+
+
+class _DiskCachedEmbeddings:
+    """Embedding function that reuses chunk vectors saved by earlier test runs"""
+
+    def __init__(self, embed, path: Path):
+        self._embed = embed
+        self._path = path
+        self._vectors = {}
+        if path.exists():
+            with np.load(path) as saved:
+                vectors = saved["vectors"].astype(np.float32)
+                self._vectors = dict(zip(saved["keys"], vectors, strict=True))
+
+    def __call__(self, texts):
+        keys = [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+        missing = {
+            key: text
+            for key, text in zip(keys, texts, strict=True)
+            if key not in self._vectors
+        }
+        if missing:
+            vectors = self._embed(list(missing.values()))
+            for key, vector in zip(missing, vectors, strict=True):
+                self._vectors[key] = np.asarray(vector, dtype=np.float32)
+        return [self._vectors[key] for key in keys]
+
+    def save(self):
+        if self._vectors:
+            np.savez_compressed(
+                self._path,
+                keys=np.array(list(self._vectors)),
+                # Half precision halves the file; rankings are stable to fp16
+                vectors=np.stack(list(self._vectors.values())).astype(np.float16),
+            )
+
+
+@pytest.fixture(scope="session")
+def rag_system(real_test_config, request):
+    """Real RAGSystem built once, so the embedding model and ChromaDB load once"""
+    system = RAGSystem(real_test_config)
+
+    # Reuse corpus embeddings across runs when pytest's cache is enabled
+    cache = getattr(request.config, "cache", None)
+    if cache is None:
+        yield system
+        return
+
+    store = system.vector_store
+    model_name = real_test_config.EMBEDDING_MODEL.replace("/", "_")
+    embeddings = _DiskCachedEmbeddings(
+        store.embedding_function,
+        Path(cache.mkdir("rag_embeddings")) / f"{model_name}.npz",
+    )
+    store.embedding_function = embeddings
+    yield system
+    embeddings.save()
+
+
+@pytest.fixture(scope="session")
+def loaded_rag_system(rag_system):
+    """rag_system with ../docs ingested once, plus the (courses, chunks) it added"""
+    if not DOCS_AVAILABLE:
+        logger.debug("✗ Docs folder not found")
+        pytest.skip("Docs folder not available")
+
+    courses, chunks = rag_system.add_course_folder(
+        DOCS_PATH, clear_existing=True, max_files=MAX_TEST_FILES
+    )
+    return rag_system, courses, chunks
+
+
+# Tool output that reports a failure instead of search results
+ERROR_TEXT_PATTERN = re.compile(r"error|failed", re.IGNORECASE)
+
+# Each layer between the AI tool loop and ChromaDB, searched the same way
+SEARCH_LAYERS = {
+    "vector_store": lambda rag: rag.vector_store.search("programming"),
+    "search_tool": lambda rag: rag.search_tool.execute("programming"),
+    "tool_manager": lambda rag: rag.tool_manager.execute_tool(
+        "search_course_content", query="programming"
+    ),
+}
+
 
 class TestRealSystemIntegration:
     """Test the real system with actual components to identify issues"""
 
-    @pytest.fixture
-    def real_test_config(self):
-        """Create config for real system testing with temp directory"""
-        temp_dir = tempfile.mkdtemp()
-        config = Config()
-        config.CHROMA_PATH = temp_dir
-        config.ANTHROPIC_API_KEY = "test-key"  # This will fail but let's see where
-        yield config
-        shutil.rmtree(temp_dir)
-
-    def test_system_initialization(self, real_test_config):
+    def test_system_initialization(self, rag_system):
         """Test if the system can be initialized with real components"""
         try:
-            rag_system = RAGSystem(real_test_config)
             assert rag_system.vector_store is not None
             assert rag_system.ai_generator is not None
             assert rag_system.tool_manager is not None
             assert rag_system.search_tool is not None
-            print("✓ System initialization successful")
+            logger.debug("✓ System initialization successful")
         except Exception as e:
-            print(f"✗ System initialization failed: {e}")
+            logger.debug("✗ System initialization failed: %s", e)
             raise
 
-    def test_course_loading(self, real_test_config):
+    def test_course_loading(self, loaded_rag_system):
         """Test loading actual course documents"""
+        _, courses, chunks = loaded_rag_system
+        logger.debug("✓ Loaded %d courses with %d chunks", courses, chunks)
+        assert courses > 0, "No courses were loaded"
+        assert chunks > 0, "No chunks were created"
+
+    @pytest.mark.parametrize("layer", list(SEARCH_LAYERS))
+    def test_search_path(self, loaded_rag_system, layer):
+        """Test searching real data through each layer of the search path"""
+        rag_system, courses, chunks = loaded_rag_system
         try:
-            rag_system = RAGSystem(real_test_config)
-
-            docs_path = "../docs"
-            if os.path.exists(docs_path):
-                courses, chunks = rag_system.add_course_folder(docs_path)
-                print(f"✓ Loaded {courses} courses with {chunks} chunks")
-                assert courses > 0, "No courses were loaded"
-                assert chunks > 0, "No chunks were created"
-            else:
-                print("✗ Docs folder not found")
-                pytest.skip("Docs folder not available")
-
-        except Exception as e:
-            print(f"✗ Course loading failed: {e}")
-            raise
-
-    def test_vector_store_search(self, real_test_config):
-        """Test vector store search functionality directly"""
-        try:
-            rag_system = RAGSystem(real_test_config)
-
-            # Add some test content first
-            docs_path = "../docs"
-            if os.path.exists(docs_path):
-                courses, chunks = rag_system.add_course_folder(docs_path)
-                print(f"Loaded {courses} courses for search test")
-
-                if chunks > 0:
-                    # Test direct vector store search
-                    results = rag_system.vector_store.search("programming")
-
-                    if results.error:
-                        print(f"✗ Vector store search error: {results.error}")
-                        raise Exception(f"Vector store search failed: {results.error}")
-                    else:
-                        print(
-                            f"✓ Vector store search returned {len(results.documents)} results"
-                        )
-                        print(
-                            f"Sample result: {results.documents[0][:100] if results.documents else 'No documents'}"
-                        )
-                else:
-                    print("✗ No chunks loaded for search test")
-            else:
-                pytest.skip("Docs folder not available")
-
-        except Exception as e:
-            print(f"✗ Vector store search test failed: {e}")
-            raise
+            logger.debug("Loaded %d courses for %s search test", courses, layer)
+
+            if chunks > 0:
+                result = SEARCH_LAYERS[layer](rag_system)
+
+                if layer == "vector_store":
+                    if result.error:
+                        logger.debug("✗ Vector store search error: %s", result.error)
+                        raise Exception(f"Vector store search failed: {result.error}")
+                    logger.debug(
+                        "✓ Vector store search returned %d results",
+                        len(result.documents),
+                    )
+                    logger.debug(
+                        "Sample result: %.100s",
+                        result.documents[0] if result.documents else "No documents",
+                    )
+                    return
 
-    def test_search_tool_execution(self, real_test_config):
-        """Test CourseSearchTool execution with real data"""
-        try:
-            rag_system = RAGSystem(real_test_config)
-
-            # Load courses
-            docs_path = "../docs"
-            if os.path.exists(docs_path):
-                courses, chunks = rag_system.add_course_folder(docs_path)
-                print(f"Loaded {courses} courses for search tool test")
-
-                if chunks > 0:
-                    # Test search tool execution
-                    result = rag_system.search_tool.execute("programming")
-                    print(f"✓ Search tool result: {result[:200]}...")
-
-                    # Check if it returned an error message
-                    if "error" in result.lower() or "failed" in result.lower():
-                        print(f"✗ Search tool returned error: {result}")
-                        raise Exception(f"Search tool execution failed: {result}")
-                    else:
-                        print("✓ Search tool execution successful")
-                else:
-                    print("✗ No chunks loaded for search tool test")
-            else:
-                pytest.skip("Docs folder not available")
+                logger.debug("✓ %s result: %.200s...", layer, result)
 
-        except Exception as e:
-            print(f"✗ Search tool execution test failed: {e}")
-            raise
+                # Check if it returned an error message
+                if ERROR_TEXT_PATTERN.search(result):
+                    logger.debug("✗ %s returned error: %s", layer, result)
+                    raise Exception(f"{layer} execution failed: {result}")
+                logger.debug("✓ %s execution successful", layer)
 
-    def test_tool_manager_execution(self, real_test_config):
-        """Test ToolManager execution with real tools"""
-        try:
-            rag_system = RAGSystem(real_test_config)
-
-            # Load courses
-            docs_path = "../docs"
-            if os.path.exists(docs_path):
-                courses, chunks = rag_system.add_course_folder(docs_path)
-                print(f"Loaded {courses} courses for tool manager test")
-
-                if chunks > 0:
-                    # Test tool manager execution
-                    result = rag_system.tool_manager.execute_tool(
-                        "search_course_content", query="programming"
-                    )
-                    print(f"✓ Tool manager result: {result[:200]}...")
-
-                    # Check for error patterns
-                    if "error" in result.lower() or "failed" in result.lower():
-                        print(f"✗ Tool manager returned error: {result}")
-                        raise Exception(f"Tool manager execution failed: {result}")
-                    else:
-                        print("✓ Tool manager execution successful")
-
-                    # Test sources
-                    sources = rag_system.tool_manager.get_last_sources()
-                    print(f"✓ Sources retrieved: {len(sources)} sources")
-                    for i, source in enumerate(sources[:3]):  # Show first 3
-                        print(f"  Source {i+1}: {source}")
-                else:
-                    print("✗ No chunks loaded for tool manager test")
+                # Test sources
+                sources = rag_system.tool_manager.get_last_sources()
+                logger.debug("✓ Sources retrieved: %d sources", len(sources))
+                for i, source in enumerate(sources[:3]):  # Show first 3
+                    logger.debug("  Source %d: %s", i + 1, source)
             else:
-                pytest.skip("Docs folder not available")
+                logger.debug("✗ No chunks loaded for %s search test", layer)
 
         except Exception as e:
-            print(f"✗ Tool manager execution test failed: {e}")
+            logger.debug("✗ %s search test failed: %s", layer, e)
             raise
 
-    def test_ai_generator_without_api_key(self, real_test_config):
+    def test_ai_generator_without_api_key(self, rag_system, monkeypatch):
         """Test AI generator behavior when API key is invalid"""
-        try:
-            rag_system = RAGSystem(real_test_config)
 
-            # This should fail because we don't have a real API key
-            # But let's see what error we get
-            try:
-                response = rag_system.ai_generator.generate_response(
+        # Answer like the API does for a bad key, without leaving the process
+        def reject_api_key(request):
+            return httpx.Response(
+                401,
+                json={
+                    "type": "error",
+                    "error": {
+                        "type": "authentication_error",
+                        "message": "invalid x-api-key",
+                    },
+                },
+            )
+
+        client = anthropic.AsyncAnthropic(
+            api_key=rag_system.config.ANTHROPIC_API_KEY,
+            http_client=httpx.AsyncClient(
+                transport=httpx.MockTransport(reject_api_key)
+            ),
+        )
+        monkeypatch.setattr(rag_system.ai_generator, "client", client)
+
+        with pytest.raises(anthropic.AuthenticationError) as ai_error:
+            asyncio.run(
+                rag_system.ai_generator.generate_response(
                     "What is Python?",
                     tools=rag_system.tool_manager.get_tool_definitions(),
                     tool_manager=rag_system.tool_manager,
                 )
-                print(f"✗ Unexpected success: {response}")
-            except Exception as ai_error:
-                print(
-                    f"✓ Expected AI error (no valid API key): {type(ai_error).__name__}: {ai_error}"
-                )
-                # This is expected - we don't have a real API key
-
-        except Exception as e:
-            print(f"✗ AI generator test setup failed: {e}")
-            raise
+            )
+        logger.debug("✓ Expected AI error (no valid API key): %s", ai_error.value)
 
     def test_check_dependencies(self):
         """Test that all required dependencies are available"""
-        try:
-            import chromadb  # noqa: F401
-
-            print("✓ chromadb available")
-        except ImportError as e:
-            print(f"✗ chromadb missing: {e}")
-
-        try:
-            import anthropic  # noqa: F401
-
-            print("✓ anthropic available")
-        except ImportError as e:
-            print(f"✗ anthropic missing: {e}")
-
-        try:
-            import sentence_transformers  # noqa: F401
+        # find_spec locates each package without running its (torch-heavy) import
+        missing = []
+        for package in ("chromadb", "anthropic", "sentence_transformers"):
+            if importlib.util.find_spec(package) is None:
+                logger.debug("✗ %s missing", package)
+                missing.append(package)
+            else:
+                logger.debug("✓ %s available", package)
 
-            print("✓ sentence_transformers available")
-        except ImportError as e:
-            print(f"✗ sentence_transformers missing: {e}")
+        assert not missing, f"Missing dependencies: {', '.join(missing)}"
 
     def test_environment_setup(self):
         """Test environment configuration"""
         config = Config()
-        print(f"API Key set: {'Yes' if config.ANTHROPIC_API_KEY else 'No'}")
-        print(f"Model: {config.ANTHROPIC_MODEL}")
-        print(f"Embedding model: {config.EMBEDDING_MODEL}")
-        print(f"Chunk size: {config.CHUNK_SIZE}")
-        print(f"Max results: {config.MAX_RESULTS}")
+        logger.debug("API Key set: %s", "Yes" if config.ANTHROPIC_API_KEY else "No")
+        logger.debug("Model: %s", config.ANTHROPIC_MODEL)
+        logger.debug("Embedding model: %s", config.EMBEDDING_MODEL)
+        logger.debug("Chunk size: %d", config.CHUNK_SIZE)
+        logger.debug("Max results: %d", config.MAX_RESULTS)
 
-    def test_document_processor_directly(self, real_test_config):
+    def test_document_processor_directly(self, rag_system):
         """Test document processor with real files"""
+        if not DOCS_AVAILABLE:
+            pytest.skip("Docs folder not available")
+
         try:
-            rag_system = RAGSystem(real_test_config)
+            if DOCS_FILES:
+                test_file = os.path.join(DOCS_PATH, DOCS_FILES[0])
+                logger.debug("Testing document processor with: %s", test_file)
 
-            docs_path = "../docs"
-            if os.path.exists(docs_path):
-                files = [f for f in os.listdir(docs_path) if f.endswith(".txt")]
-                if files:
-                    test_file = os.path.join(docs_path, files[0])
-                    print(f"Testing document processor with: {test_file}")
+                course, chunks = rag_system.document_processor.process_course_document(
+                    test_file
+                )
 
-                    course, chunks = (
-                        rag_system.document_processor.process_course_document(test_file)
+                if course:
+                    logger.debug("✓ Course processed: %s", course.title)
+                    logger.debug("✓ Chunks created: %d", len(chunks))
+                    logger.debug(
+                        "✓ Sample chunk: %.100s...",
+                        chunks[0].content if chunks else "No chunks",
                     )
-
-                    if course:
-                        print(f"✓ Course processed: {course.title}")
-                        print(f"✓ Chunks created: {len(chunks)}")
-                        print(
-                            f"✓ Sample chunk: {chunks[0].content[:100] if chunks else 'No chunks'}..."
-                        )
-                    else:
-                        print("✗ No course data returned from document processor")
                 else:
-                    print("✗ No text files found in docs folder")
+                    logger.debug("✗ No course data returned from document processor")
             else:
-                pytest.skip("Docs folder not available")
+                logger.debug("✗ No text files found in docs folder")
 
         except Exception as e:
-            print(f"✗ Document processor test failed: {e}")
+            logger.debug("✗ Document processor test failed: %s", e)
             raise
@@ -0,0 +1,87 @@
+from unittest.mock import patch
+
+from response_cache import SemanticResponseCache
+
+SOURCES = [{"text": "Python Basics - Lesson 1", "link": "https://example.com/lesson/1"}]
+
+
+class TestSemanticResponseCache:
+    """Test SemanticResponseCache lookup, expiry and eviction"""
+
+    def test_empty_cache_misses(self):
+        """Test that an empty cache never returns a hit"""
+        cache = SemanticResponseCache()
+
+        assert cache.get([1.0, 0.0]) is None
+
+    def test_similar_query_hits(self):
+        """Test that a query above the similarity threshold returns the answer"""
+        cache = SemanticResponseCache(threshold=0.9)
+        cache.put([1.0, 0.0], "Cached answer", SOURCES)
+
+        # Scaled and slightly rotated vector is still highly similar
+        assert cache.get([2.0, 0.1]) == ("Cached answer", SOURCES)
+
+    def test_dissimilar_query_misses(self):
+        """Test that a query below the similarity threshold is a miss"""
+        cache = SemanticResponseCache(threshold=0.9)
+        cache.put([1.0, 0.0], "Cached answer", SOURCES)
+
+        assert cache.get([0.0, 1.0]) is None
+
+    def test_context_must_match(self):
+        """Test that answers are not shared across different conversation contexts"""
+        cache = SemanticResponseCache()
+        cache.put([1.0, 0.0], "Answer about lesson 1", SOURCES, context="Lesson 1?")
+
+        assert cache.get([1.0, 0.0], context="Lesson 2?") is None
+        assert cache.get([1.0, 0.0]) is None
+        assert cache.get([1.0, 0.0], context="Lesson 1?") == (
+            "Answer about lesson 1",
+            SOURCES,
+        )
+
+    def test_expired_entries_miss(self):
+        """Test that entries older than the TTL are ignored and purged"""
+        cache = SemanticResponseCache(ttl_seconds=10)
+
+        with patch("response_cache.time.monotonic", return_value=100.0):
+            cache.put([1.0, 0.0], "Old answer", SOURCES)
+
+        with patch("response_cache.time.monotonic", return_value=111.0):
+            assert cache.get([1.0, 0.0]) is None
+            cache.put([0.0, 1.0], "New answer", [])
+
+        assert len(cache) == 1
+
+    def test_least_recently_used_entry_evicted(self):
+        """Test that the LRU entry is evicted once the cache is full"""
+        cache = SemanticResponseCache(max_entries=2)
+
+        with patch(
+            "response_cache.time.monotonic", side_effect=[1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+        ):
+            cache.put([1.0, 0.0], "First", [])
+            cache.put([0.0, 1.0], "Second", [])
+            # Touch the first entry so the second becomes least recently used
+            cache.get([1.0, 0.0])
+            cache.put([1.0, 1.0], "Third", [])
+
+            assert len(cache) == 2
+            assert cache.get([1.0, 0.0]) == ("First", [])
+            assert cache.get([0.0, 1.0]) is None
+
+    def test_matrix_allocated_once_and_rows_reused(self):
+        """Test that puts write into the preallocated matrix instead of growing it"""
+        cache = SemanticResponseCache(max_entries=2)
+        cache.put([1.0, 0.0], "First", [])
+        matrix = cache.embeddings
+
+        cache.put([0.0, 1.0], "Second", [])
+        cache.put([1.0, 1.0], "Third", [])
+
+        assert cache.embeddings is matrix
+        assert matrix.shape == (2, 2)
+        assert len(cache) == 2
+        assert cache.get([1.0, 1.0]) == ("Third", [])
+        assert cache.get([0.0, 1.0]) == ("Second", [])
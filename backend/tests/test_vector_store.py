@@ -0,0 +1,184 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from models import CourseChunk
+from vector_store import VectorStore, _load_embedding_function
+
+
+class TestVectorStore:
+    """Test VectorStore writes against a mocked ChromaDB client"""
+
+    @pytest.fixture
+    def store(self):
+        """Create a VectorStore whose ChromaDB client is a mock"""
+        # Don't hand a previous test's embedding mock to this store
+        _load_embedding_function.cache_clear()
+        with patch("vector_store.chromadb") as chromadb:
+            client = chromadb.PersistentClient.return_value
+            client.get_or_create_collection.return_value.metadata = (
+                VectorStore.HNSW_METADATA
+            )
+            store = VectorStore("unused-path", "test-model", max_results=5)
+        return store
+
+    def test_embedding_model_shared_between_stores(self, store):
+        """Test that a second store for the same model reuses the loaded model"""
+        with patch("vector_store.chromadb") as chromadb:
+            same_model = VectorStore("other-path", "test-model")
+            other_model = VectorStore("other-path", "other-model")
+
+        assert same_model.embedding_function is store.embedding_function
+        assert other_model.embedding_function is not store.embedding_function
+        load = chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction
+        load.assert_called_once_with(model_name="other-model")
+
+    def test_in_memory_store_skips_persistent_client(self):
+        """Test that in-memory stores use an ephemeral ChromaDB client"""
+        with patch("vector_store.chromadb") as chromadb:
+            store = VectorStore("unused-path", "test-model", in_memory=True)
+
+        chromadb.PersistentClient.assert_not_called()
+        chromadb.EphemeralClient.assert_called_once()
+        assert store.client is chromadb.EphemeralClient.return_value
+
+    def test_hnsw_metadata_applied(self, store):
+        """Test that both collections are created with the tuned HNSW settings"""
+        calls = store.client.get_or_create_collection.call_args_list
+
+        assert [call.kwargs["name"] for call in calls] == [
+            "course_catalog",
+            "course_content",
+        ]
+        for call in calls:
+            assert call.kwargs["metadata"] == VectorStore.HNSW_METADATA
+
+    @pytest.mark.parametrize(
+        "metadata, warned",
+        [
+            pytest.param(VectorStore.HNSW_METADATA, False, id="cosine"),
+            pytest.param({"hnsw:space": "l2"}, True, id="l2"),
+            pytest.param(None, True, id="default_l2"),
+        ],
+    )
+    def test_distance_metric_mismatch_warns(self, capsys, metadata, warned):
+        """Test that an existing collection with another distance metric is reported"""
+        with patch("vector_store.chromadb") as chromadb:
+            client = chromadb.PersistentClient.return_value
+            client.get_or_create_collection.return_value.metadata = metadata
+            VectorStore("unused-path", "test-model")
+
+        output = capsys.readouterr().out
+        assert ("distance metric" in output) is warned
+        if warned:
+            assert "course_catalog" in output and "course_content" in output
+
+    @staticmethod
+    def make_chunks(count):
+        """Build count chunks for one course with sequential indexes"""
+        return [
+            CourseChunk(
+                content=f"Chunk {index}",
+                course_title="Test Course",
+                lesson_number=index % 3,
+                chunk_index=index,
+            )
+            for index in range(count)
+        ]
+
+    @pytest.mark.parametrize("count,expected_batches", [(3, 1), (200, 1), (450, 3)])
+    def test_add_course_content_batches(self, store, count, expected_batches):
+        """Test that chunks are inserted in batches of at most ADD_BATCH_SIZE"""
+        store.add_course_content(self.make_chunks(count))
+
+        add_calls = store.course_content.add.call_args_list
+        assert len(add_calls) == expected_batches
+
+        ids = []
+        for call in add_calls:
+            kwargs = call.kwargs
+            assert 0 < len(kwargs["ids"]) <= VectorStore.ADD_BATCH_SIZE
+            assert len(kwargs["documents"]) == len(kwargs["ids"])
+            assert len(kwargs["metadatas"]) == len(kwargs["ids"])
+            ids.extend(kwargs["ids"])
+
+        # Every chunk is written exactly once, in order
+        assert ids == [f"Test_Course_{index}" for index in range(count)]
+
+    def test_add_course_content_precomputes_embeddings(self, store):
+        """Test that each batch is embedded in one call and passed to ChromaDB"""
+        store.embedding_function.side_effect = lambda texts: [[0.5, 0.5] for _ in texts]
+
+        store.add_course_content(self.make_chunks(250))
+
+        embed_calls = store.embedding_function.call_args_list
+        add_calls = store.course_content.add.call_args_list
+        assert len(embed_calls) == len(add_calls) == 2
+        for embed_call, add_call in zip(embed_calls, add_calls, strict=True):
+            documents = add_call.kwargs["documents"]
+            assert embed_call.args == (documents,)
+            assert len(add_call.kwargs["embeddings"]) == len(documents)
+
+    def test_add_course_content_empty(self, store):
+        """Test that an empty chunk list skips ChromaDB entirely"""
+        store.add_course_content([])
+
+        store.course_content.add.assert_not_called()
+
+    def test_repeated_query_embedded_once(self, store):
+        """Test that searching the same query twice reuses the cached embedding"""
+        store.embedding_function.return_value = [[0.6, 0.8]]
+        store.course_content.query.return_value = {
+            "documents": [["Test content"]],
+            "metadatas": [[{"course_title": "Test Course", "lesson_number": 1}]],
+            "distances": [[0.1]],
+        }
+
+        first = store.search("What is Python?")
+        second = store.search("What is Python?")
+
+        store.embedding_function.assert_called_once_with(["What is Python?"])
+        assert first == second
+        assert store.course_content.query.call_count == 2
+        assert store.course_content.query.call_args.kwargs["query_embeddings"] == [
+            [0.6, 0.8]
+        ]
+
+    def test_embedding_failure_returns_search_error(self, store):
+        """Test that an embedding failure surfaces as an empty result with an error"""
+        store.embedding_function.side_effect = RuntimeError("model unavailable")
+
+        results = store.search("What is Python?")
+
+        assert results.is_empty()
+        assert results.error == "Search error: model unavailable"
+        store.course_content.query.assert_not_called()
+
+    def test_get_lesson_links_single_catalog_lookup(self, store):
+        """Test that links for several lessons come from one catalog query"""
+        lessons = [
+            {"lesson_number": 1, "lesson_link": "https://example.com/a/1"},
+            {"lesson_number": 2, "lesson_link": "https://example.com/a/2"},
+        ]
+        store.course_catalog.get.return_value = {
+            "ids": ["Course A"],
+            "metadatas": [{"title": "Course A", "lessons_json": json.dumps(lessons)}],
+        }
+
+        links = store.get_lesson_links(
+            [("Course A", 2), ("Course A", 1), ("Course A", 9), ("Course B", 1)]
+        )
+
+        store.course_catalog.get.assert_called_once_with(ids=["Course A", "Course B"])
+        assert links == {
+            ("Course A", 2): "https://example.com/a/2",
+            ("Course A", 1): "https://example.com/a/1",
+            ("Course A", 9): None,
+            ("Course B", 1): None,
+        }
+
+    def test_get_lesson_links_without_lessons(self, store):
+        """Test that an empty request skips the catalog entirely"""
+        assert store.get_lesson_links([]) == {}
+
+        store.course_catalog.get.assert_not_called()
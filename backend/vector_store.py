@@ -1,4 +1,6 @@
+import json
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any
 
 import chromadb
@@ -6,7 +8,7 @@ from chromadb.config import Settings
 from models import Course, CourseChunk
 
 
-@dataclass
+@dataclass(slots=True)
 class SearchResults:
     """Container for search results with metadata"""
 
@@ -40,21 +42,51 @@ class SearchResults:
         return len(self.documents) == 0
 
 
+@lru_cache(maxsize=4)
+def _load_embedding_function(model_name: str):
+    """Load a sentence transformer once per model, shared by every VectorStore"""
+    return chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction(
+        model_name=model_name
+    )
+
+
 class VectorStore:
     """Vector storage using ChromaDB for course content and metadata"""
 
-    def __init__(self, chroma_path: str, embedding_model: str, max_results: int = 5):
+    # Chunks sent to ChromaDB per add() call when indexing course content
+    ADD_BATCH_SIZE = 200
+    # Distinct query strings whose embeddings are kept in memory
+    QUERY_CACHE_SIZE = 1024
+    # HNSW index settings; ChromaDB only applies them when a collection is created
+    HNSW_METADATA = {
+        "hnsw:space": "cosine",
+        "hnsw:construction_ef": 200,
+        "hnsw:M": 32,
+        "hnsw:search_ef": 64,
+    }
+
+    def __init__(
+        self,
+        chroma_path: str,
+        embedding_model: str,
+        max_results: int = 5,
+        in_memory: bool = False,
+    ):
         self.max_results = max_results
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(
-            path=chroma_path, settings=Settings(anonymized_telemetry=False)
-        )
+        # Initialize ChromaDB client; in-memory stores skip all disk writes
+        settings = Settings(anonymized_telemetry=False)
+        if in_memory:
+            self.client = chromadb.EphemeralClient(settings=settings)
+        else:
+            self.client = chromadb.PersistentClient(path=chroma_path, settings=settings)
 
         # Set up sentence transformer embedding function
-        self.embedding_function = (
-            chromadb.utils.embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name=embedding_model
-            )
+        self.embedding_function = _load_embedding_function(embedding_model)
+
+        # Repeated queries and course names skip the embedding model; cached per
+        # instance so the store can be garbage collected
+        self._embed_query = lru_cache(maxsize=self.QUERY_CACHE_SIZE)(
+            self._compute_query_embedding
         )
 
         # Create collections for different types of data
@@ -67,10 +99,31 @@ class VectorStore:
 
     def _create_collection(self, name: str):
         """Create or get a ChromaDB collection"""
-        return self.client.get_or_create_collection(
-            name=name, embedding_function=self.embedding_function
+        collection = self.client.get_or_create_collection(
+            name=name,
+            embedding_function=self.embedding_function,
+            metadata=self.HNSW_METADATA,
         )
 
+        # Collections created before HNSW_METADATA keep their original distance
+        # metric (ChromaDB defaults to l2), which ranks results differently
+        space = (collection.metadata or {}).get("hnsw:space", "l2")
+        if space != self.HNSW_METADATA["hnsw:space"]:
+            print(
+                f"Warning: collection '{name}' uses the '{space}' distance metric "
+                f"instead of '{self.HNSW_METADATA['hnsw:space']}'; rebuild it with "
+                "clear_existing=True to apply the current index settings"
+            )
+        return collection
+
+    def _compute_query_embedding(self, query: str) -> tuple[float, ...]:
+        """Run the embedding model on a single query"""
+        return tuple(float(value) for value in self.embedding_function([query])[0])
+
+    def embed_query(self, query: str) -> tuple[float, ...]:
+        """Embed a query with the same model used for the collections"""
+        return self._embed_query(query)
+
     def search(
         self,
         query: str,
@@ -106,7 +159,9 @@ class VectorStore:
 
         try:
             results = self.course_content.query(
-                query_texts=[query], n_results=search_limit, where=filter_dict
+                query_embeddings=[list(self.embed_query(query))],
+                n_results=search_limit,
+                where=filter_dict,
             )
             return SearchResults.from_chroma(results)
         except Exception as e:
@@ -115,7 +170,9 @@ class VectorStore:
     def _resolve_course_name(self, course_name: str) -> str | None:
         """Use vector search to find best matching course by name"""
         try:
-            results = self.course_catalog.query(query_texts=[course_name], n_results=1)
+            results = self.course_catalog.query(
+                query_embeddings=[list(self.embed_query(course_name))], n_results=1
+            )
 
             if results["documents"][0] and results["metadatas"][0]:
                 # Return the title (which is now the ID)
@@ -148,8 +205,6 @@ class VectorStore:
 
     def add_course_metadata(self, course: Course):
         """Add course information to the catalog for semantic search"""
-        import json
-
         course_text = course.title
 
         # Build lessons metadata and serialize as JSON string
@@ -184,22 +239,33 @@ class VectorStore:
         if not chunks:
             return
 
-        documents = [chunk.content for chunk in chunks]
-        metadatas = [
-            {
-                "course_title": chunk.course_title,
-                "lesson_number": chunk.lesson_number,
-                "chunk_index": chunk.chunk_index,
-            }
-            for chunk in chunks
-        ]
-        # Use title with chunk index for unique IDs
-        ids = [
-            f"{chunk.course_title.replace(' ', '_')}_{chunk.chunk_index}"
-            for chunk in chunks
-        ]
+        # Insert in bounded batches so large documents don't build one huge request
+        for start in range(0, len(chunks), self.ADD_BATCH_SIZE):
+            batch = chunks[start : start + self.ADD_BATCH_SIZE]
 
-        self.course_content.add(documents=documents, metadatas=metadatas, ids=ids)
+            documents = [chunk.content for chunk in batch]
+            # Embed the whole batch in one model call rather than leaving it to add()
+            embeddings = self.embedding_function(documents)
+            metadatas = [
+                {
+                    "course_title": chunk.course_title,
+                    "lesson_number": chunk.lesson_number,
+                    "chunk_index": chunk.chunk_index,
+                }
+                for chunk in batch
+            ]
+            # Use title with chunk index for unique IDs
+            ids = [
+                f"{chunk.course_title.replace(' ', '_')}_{chunk.chunk_index}"
+                for chunk in batch
+            ]
+
+            self.course_content.add(
+                documents=documents,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                ids=ids,
+            )
 
     def clear_all_data(self):
         """Clear all data from both collections"""
@@ -237,8 +303,6 @@ class VectorStore:
 
     def get_all_courses_metadata(self) -> list[dict[str, Any]]:
         """Get metadata for all courses in the vector store"""
-        import json
-
         try:
             results = self.course_catalog.get()
             if results and "metadatas" in results:
@@ -273,20 +337,30 @@ class VectorStore:
 
     def get_lesson_link(self, course_title: str, lesson_number: int) -> str | None:
         """Get lesson link for a given course title and lesson number"""
-        import json
+        key = (course_title, lesson_number)
+        return self.get_lesson_links([key])[key]
+
+    def get_lesson_links(
+        self, lessons: list[tuple[str, int]]
+    ) -> dict[tuple[str, int], str | None]:
+        """Get lesson links for several (course title, lesson number) pairs at once"""
+        links = dict.fromkeys(lessons)
+        course_titles = list(dict.fromkeys(title for title, _ in lessons))
+        if not course_titles:
+            return links
 
         try:
-            # Get course by ID (title is the ID)
-            results = self.course_catalog.get(ids=[course_title])
-            if results and "metadatas" in results and results["metadatas"]:
-                metadata = results["metadatas"][0]
+            # One catalog lookup covers every course in the batch
+            results = self.course_catalog.get(ids=course_titles)
+            for metadata in results.get("metadatas") or []:
                 lessons_json = metadata.get("lessons_json")
-                if lessons_json:
-                    lessons = json.loads(lessons_json)
-                    # Find the lesson with matching number
-                    for lesson in lessons:
-                        if lesson.get("lesson_number") == lesson_number:
-                            return lesson.get("lesson_link")
-            return None
+                if not lessons_json:
+                    continue
+                for lesson in json.loads(lessons_json):
+                    key = (metadata["title"], lesson.get("lesson_number"))
+                    if key in links:
+                        links[key] = lesson.get("lesson_link")
         except Exception as e:
-            print(f"Error getting lesson link: {e}")
+            print(f"Error getting lesson links: {e}")
+
+        return links
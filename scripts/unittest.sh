@@ -0,0 +1,20 @@
+#!/bin/bash
+
+# Run the backend test suite across all CPU cores with pytest-xdist
+# Usage: ./scripts/unittest.sh [report] [test paths...]
+#   report  also print the slowest tests so regressions are easy to spot
+
+set -e
+
+cd "$(dirname "$0")/../backend"
+
+if [ "$1" = "report" ]; then
+    shift
+    echo "🧪 Running tests with a timing report..."
+    uv run pytest -n auto --durations=15 "${@:-tests/}"
+else
+    echo "🧪 Running tests..."
+    uv run pytest -n auto "${@:-tests/}"
+fi
+
+echo "✅ Tests complete!"